@@ -0,0 +1,174 @@
+"""End-to-end benchmark of the app: input -> draft -> approved -> final, headless with the fake model.
+
+    python benchmarks/bench_app.py --tokens 4000 --ttft 0.2 --output results.json
+    python benchmarks/bench_app.py --baseline results.json
+
+Drives `StreamlitUI` through `streamlit.testing.v1.AppTest` and reports the
+median rerun latency of each step, the peak deep size of `st.session_state`,
+the memory held by the shared artifact store and the export time per output
+format. With --baseline, numbers that got more than --tolerance worse than a
+previous --output are flagged.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+APP = os.path.join(HERE, "..", "src", "stui.py")
+
+
+def deep_size(value, seen=None):
+    """Approximate bytes held by `value` and everything it references"""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(key, seen) + deep_size(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += deep_size(vars(value), seen)
+    return size
+
+
+class Driver:
+    def __init__(self, runs, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.runs = runs
+        self.timeout = timeout
+        self.at = AppTest.from_file(APP, default_timeout=60)
+        self.results = {'rerun_ms': {}, 'export_s': {}, 'session_state_peak_kib': 0.0}
+
+    def run(self, action=None):
+        started = time.perf_counter()
+        (action or self.at).run()
+        elapsed = time.perf_counter() - started
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].message)
+        size = deep_size(self.at.session_state.to_dict()) / 1024
+        self.results['session_state_peak_kib'] = max(self.results['session_state_peak_kib'], size)
+        return elapsed
+
+    def measure_step(self, step):
+        assert self.at.session_state.generation_step == step, self.at.session_state.generation_step
+        times = [self.run() for _ in range(self.runs)]
+        self.results['rerun_ms'][step] = statistics.median(times) * 1000
+
+    def button(self, prefix):
+        return next(button for button in self.at.button if button.label.startswith(prefix))
+
+    def wait_for(self, done):
+        """Rerun until `done()` holds, as the polling fragments would, and return the seconds waited"""
+        started = time.perf_counter()
+        while not done():
+            if time.perf_counter() - started > self.timeout:
+                raise TimeoutError("The background job did not finish")
+            time.sleep(0.05)
+            self.run()
+        return time.perf_counter() - started
+
+    def downloads(self):
+        return list(self.at.get("download_button"))
+
+
+def benchmark(args):
+    driver = Driver(args.runs, args.timeout)
+    at = driver.at
+    started = time.perf_counter()
+    driver.run()
+    driver.results['first_run_ms'] = (time.perf_counter() - started) * 1000
+    driver.measure_step("input")
+
+    at.text_input[0].input("Biology")
+    at.text_input[1].input("Photosynthesis")
+    driver.run(at.button[0].click())
+    driver.results['draft_generation_s'] = driver.wait_for(lambda: 'draft_job' not in at.session_state)
+    driver.results['draft_kib'] = at.session_state.generated_draft.size / 1024
+    driver.measure_step("draft")
+
+    driver.run(driver.button("✅").click())
+    driver.measure_step("approved")
+
+    for output_format in args.formats:
+        at.selectbox(key="output_format").select(output_format)
+        driver.run()
+        started = time.perf_counter()
+        driver.run(driver.button("📄 Generate").click())
+        driver.wait_for(driver.downloads)
+        driver.results['export_s'][output_format] = time.perf_counter() - started
+        if output_format == args.formats[0]:
+            driver.measure_step("final")
+        driver.run(driver.button("🔍").click())
+
+    from artifacts import get_artifact_store
+    driver.results['artifact_memory_kib'] = get_artifact_store().stats()['memory_bytes'] / 1024
+    return driver.results
+
+
+def compare(results, baseline, tolerance):
+    """Yield (name, before, after) for numbers more than `tolerance` worse than the baseline"""
+    def flatten(data, prefix=""):
+        for key, value in data.items():
+            if isinstance(value, dict):
+                yield from flatten(value, f"{prefix}{key}.")
+            else:
+                yield f"{prefix}{key}", value
+
+    before = dict(flatten(baseline))
+    for name, after in flatten(results):
+        if name in before and before[name] and after > before[name] * (1 + tolerance):
+            yield name, before[name], after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ttft", type=float, default=0.2, help="fake model time to first token")
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=4000, help="fake draft length in chunks")
+    parser.add_argument("--runs", type=int, default=5, help="reruns timed per step")
+    parser.add_argument("--formats", nargs="+", default=["HTML", "DOCX (Word Document)", "PDF", "PPTX (Slides)"])
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON from a previous --output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    os.environ.update({
+        'EDUADOCS_FAKE_LLM': "1",
+        'EDUADOCS_FAKE_TTFT': str(args.ttft),
+        'EDUADOCS_FAKE_TOKEN_LATENCY': str(args.token_latency),
+        'EDUADOCS_FAKE_TOKENS': str(args.tokens)
+    })
+    os.environ.setdefault("EDUADOCS_DATA_DIR", tempfile.mkdtemp())
+
+    results = benchmark(args)
+    print(f"{'first run':<28}{results['first_run_ms']:8.1f} ms")
+    for step, elapsed in results['rerun_ms'].items():
+        print(f"{'rerun ' + step:<28}{elapsed:8.1f} ms")
+    print(f"{'draft generation':<28}{results['draft_generation_s']:8.2f} s  ({results['draft_kib']:.0f} KiB)")
+    for output_format, elapsed in results['export_s'].items():
+        print(f"{'export ' + output_format:<28}{elapsed:8.2f} s")
+    print(f"{'session_state peak':<28}{results['session_state_peak_kib']:8.0f} KiB")
+    print(f"{'artifact store memory':<28}{results['artifact_memory_kib']:8.0f} KiB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline:
+            regressions = list(compare(results, json.load(baseline), args.tolerance))
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.2f} -> {after:.2f}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
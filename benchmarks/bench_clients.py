@@ -0,0 +1,87 @@
+"""Connection reuse in the pooled client layer, measured against the local Ollama stand-in.
+
+    python benchmarks/bench_clients.py --requests 50 --handshake-latency 0.03
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fake_ollama import FakeOllamaServer  # noqa: E402
+from llm import ClientRegistry  # noqa: E402
+
+
+def report(label, latencies, connections):
+    latencies = sorted(latencies)
+    mean = sum(latencies) / len(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<28} mean={mean * 1000:7.1f} ms  p95={p95 * 1000:7.1f} ms  new connections={connections}")
+    return mean
+
+
+def run_sequential(server, settings, requests, pooled):
+    registry = ClientRegistry()
+    before = server.connections
+    latencies = []
+    for _ in range(requests):
+        if not pooled:
+            # What every Streamlit rerun paid before: a new client and a new connection
+            registry = ClientRegistry()
+        client = registry.get("Ollama", settings)
+        started = time.perf_counter()
+        client.generate("Explain fractions")
+        latencies.append(time.perf_counter() - started)
+    registry.close()
+    return latencies, server.connections - before
+
+
+async def run_async(server, settings, requests, concurrency):
+    registry = ClientRegistry(max_connections=concurrency, max_idle=concurrency)
+    client = registry.get("Ollama", settings)
+    semaphore = asyncio.Semaphore(concurrency)
+    before = server.connections
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await client.agenerate("Explain fractions")
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    registry.close()
+    return latencies, server.connections - before, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--first-token-latency", type=float, default=0.01)
+    parser.add_argument("--handshake-latency", type=float, default=0.03,
+                        help="simulated TCP/TLS setup cost per new connection")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(first_token_latency=args.first_token_latency, tokens=args.tokens,
+                              handshake_latency=args.handshake_latency).start()
+    settings = {"ollama_endpoint": server.endpoint, "ollama_model": "fake"}
+    print(f"fake Ollama at {server.endpoint}, {args.requests} requests, "
+          f"{args.handshake_latency * 1000:.0f} ms per new connection")
+
+    fresh = report("fresh client per request", *run_sequential(server, settings, args.requests, pooled=False))
+    pooled = report("pooled registry client", *run_sequential(server, settings, args.requests, pooled=True))
+    print(f"{'':<28} pooled saves {(fresh - pooled) * 1000:.1f} ms per request ({fresh / pooled:.2f}x)")
+
+    latencies, connections, elapsed = asyncio.run(run_async(server, settings, args.requests, args.concurrency))
+    report(f"async x{args.concurrency} pooled", latencies, connections)
+    print(f"{'':<28} wall={elapsed:.2f}s  throughput={args.requests / elapsed:.1f} req/s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
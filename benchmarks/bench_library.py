@@ -0,0 +1,119 @@
+"""Approved-document library: indexing rate, index size and BM25 query latency at tens of thousands of documents.
+
+    python benchmarks/bench_library.py --documents 10000 30000 --queries 200
+
+Documents are synthetic summaries spread over subjects and topics, each about
+--words long. The library is filled in transactions of 1000 documents, then
+--singles more are added one at a time the way approvals arrive. At every size the
+queries are content forms for topics in the library and for unseen topics, and
+the report gives p50/p95 latency and how often the top match has the asked topic.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from library import DocumentLibrary, grounding  # noqa: E402
+
+SUBJECTS = ["Biology", "Chemistry", "Physics", "Mathematics", "History", "Geography", "Literature", "Economics",
+            "Computer Science", "Philosophy"]
+AUDIENCES = ["Middle School", "High School", "Undergraduate"]
+COMMON = ("the of and to in is that for are as with by this on be it from which students can example each "
+          "important first second process result called between during because when these").split()
+
+
+def word(rng, length):
+    return "".join(rng.choice("aeioubcdfghklmnprstvz") for _ in range(length))
+
+
+class Corpus:
+    """Seeded vocabulary: shared words, words per subject and words per topic"""
+
+    def __init__(self, topics_per_subject, seed=7):
+        self.rng = random.Random(seed)
+        self.subject_words = {subject: [word(self.rng, 7) for _ in range(300)] for subject in SUBJECTS}
+        self.topics = [(subject, f"{word(self.rng, 6).title()} {word(self.rng, 8)}")
+                       for subject in SUBJECTS for _ in range(topics_per_subject)]
+        self.topic_words = {topic: [word(self.rng, 9) for _ in range(30)] for _, topic in self.topics}
+
+    def document(self, words):
+        subject, topic = self.rng.choice(self.topics)
+        vocabulary = (COMMON * 4 + self.subject_words[subject] + self.topic_words[topic] * 3 + topic.lower().split())
+        sections = [f"# {subject}: {topic}"]
+        for number in range(1, 6):
+            text = " ".join(self.rng.choice(vocabulary) for _ in range(words // 5))
+            sections.append(f"## Section {number}\n{text.capitalize()}.")
+        form_data = {'document_type': "Summary", 'subject': subject, 'topic': topic,
+                     'audience': self.rng.choice(AUDIENCES), 'language': "English", 'details': ""}
+        return form_data, "\n\n".join(sections)
+
+    def query(self, known=True):
+        subject, topic = self.rng.choice(self.topics)
+        if not known:
+            topic = f"{word(self.rng, 6).title()} {word(self.rng, 8)}"
+        return {'document_type': "Summary", 'subject': subject, 'topic': topic,
+                'audience': self.rng.choice(AUDIENCES), 'language': "English",
+                'details': " ".join(self.rng.sample(self.subject_words[subject], 4))}
+
+
+def quantile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, nargs="+", default=[10000, 30000])
+    parser.add_argument("--words", type=int, default=600)
+    parser.add_argument("--topics", type=int, default=200, help="topics per subject")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--singles", type=int, default=50, help="documents added one per transaction at each size")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "library.sqlite3")
+    library = DocumentLibrary(path=path)
+    corpus = Corpus(args.topics)
+    added = 0
+    for size in sorted(args.documents):
+        bulk, bulk_added = 0.0, 0
+        while added < size - args.singles:
+            batch = [corpus.document(args.words) for _ in range(min(1000, size - args.singles - added))]
+            started = time.perf_counter()
+            library.add_many(batch)
+            bulk += time.perf_counter() - started
+            bulk_added += len(batch)
+            added += len(batch)
+        singles = []
+        while added < size:
+            document = corpus.document(args.words)
+            started = time.perf_counter()
+            library.add(*document)
+            singles.append((time.perf_counter() - started) * 1000)
+            added += 1
+        stats = library.stats()
+
+        latencies, hits, found = [], 0, 0
+        for number in range(args.queries):
+            form_data = corpus.query(known=number % 4 != 0)
+            started = time.perf_counter()
+            matches = library.search(form_data)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if matches:
+                found += 1
+                hits += matches[0].topic_coverage == 1.0 and matches[0].topic == form_data['topic']
+        known = args.queries - (args.queries + 3) // 4
+        print(f"{size:>6} documents  {stats['terms']:>7} terms  {os.path.getsize(path) / 1024 / 1024:7.1f} MiB  "
+              f"bulk {bulk_added / bulk if bulk else 0:5.0f} docs/s  add p50 {quantile(singles, 0.5):5.1f} ms  "
+              f"query p50 {quantile(latencies, 0.5):5.1f} ms p95 {quantile(latencies, 0.95):5.1f} ms  "
+              f"top match on topic {hits}/{known} known, {found - hits} offered for unseen")
+
+    form_data, content = corpus.document(args.words)
+    print(f"\nGrounding for a {len(content)}-character document: {len(grounding(content))} characters")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Markdown-to-document rendering cost on long documents, cold and memoized.
+
+    python benchmarks/bench_rendering.py --sections 180
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import rendering  # noqa: E402
+from rendering import OUTPUT_FORMATS, RenderOptions, parse_markdown, render_document  # noqa: E402
+
+PARAGRAPH = ("Photosynthesis converts **light energy** into chemical energy stored in *glucose*. "
+             "The light-dependent reactions take place in the thylakoid membranes, while the "
+             "Calvin cycle runs in the stroma and fixes `CO2` into three-carbon sugars. ") * 3
+
+
+def build_document(sections):
+    """Roughly 0.6 PDF pages of Markdown per section"""
+    parts = ["# Biology: Photosynthesis", ""]
+    for i in range(1, sections + 1):
+        parts += [f"## Section {i}", "", PARAGRAPH, "", PARAGRAPH, "",
+                  "- Key idea one", "- Key idea two", "  - Detail", "1. Step one", "2. Step two", "",
+                  "> Remember to label every diagram.", "",
+                  "| Stage | Location |", "|---|---|", "| Light | Thylakoid |", "| Calvin | Stroma |", ""]
+    return "\n".join(parts)
+
+
+def page_count(data):
+    try:
+        import io
+        from pypdf import PdfReader
+        return len(PdfReader(io.BytesIO(data)).pages)
+    except ImportError:
+        return None
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=180)
+    parser.add_argument("--style", default="Professional")
+    args = parser.parse_args()
+
+    content = build_document(args.sections)
+    print(f"document: {len(content) / 1024:.0f} KiB of Markdown, {args.sections} sections")
+
+    blocks, elapsed = timed(parse_markdown, content)
+    print(f"parse:             {elapsed * 1000:8.1f} ms  ({len(blocks)} blocks)")
+
+    for output_format in OUTPUT_FORMATS:
+        options = RenderOptions(output_format, args.style, "11pt", True, True, "Biology: Photosynthesis",
+                                "Summary · High School")
+        data, cold = timed(render_document, content, options)
+        _, warm = timed(render_document, content, options)
+        pages = page_count(data) if options.extension == "pdf" else None
+        print(f"{options.extension:>5} cold render: {cold * 1000:8.1f} ms  warm: {warm * 1000:6.3f} ms  "
+              f"size: {len(data) / 1024:7.0f} KiB" + (f"  pages: {pages}" if pages else ""))
+
+    # A different style recompiles its template once, then reuses it
+    rendering.compile_docx_template.cache_clear()
+    _, first = timed(rendering.compile_docx_template, "Academic", "12pt")
+    _, again = timed(rendering.compile_docx_template, "Academic", "12pt")
+    print(f"docx template compile: {first * 1000:.1f} ms first, {again * 1000:.3f} ms cached")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Rerun latency and payload of the draft review and approved pages for a long draft.
+
+    python benchmarks/bench_rerun.py --tokens 13000 --runs 10
+
+Starts the app with the fake model under a headless Streamlit server and talks
+to it over the same websocket protocol as the browser: a generation fills the
+draft, then the draft editor is edited and the export style changed. Widgets
+inside a fragment are sent with the fragment id, as the browser does, so those
+interactions rerun only their fragment. Latency is from sending the rerun to
+the script finishing; payload is the bytes the server sent back.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from websockets.asyncio.client import connect
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, HERE)
+WIDGETS = ("text_input", "text_area", "button", "selectbox", "checkbox", "multiselect", "number_input")
+
+
+class Widget:
+    def __init__(self, kind, proto, fragment_id):
+        self.kind = kind
+        self.id = proto.id
+        self.label = proto.label
+        self.fragment_id = fragment_id
+
+
+class Session:
+    """Minimal browser stand-in: reruns the script and records the widgets it renders"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.widgets = {}
+        self.cached_hashes = set()
+        self.elements = []
+
+    async def rerun(self, states=(), fragment_id=None):
+        """Return (seconds, bytes received) for one rerun with the given widget states"""
+        message = BackMsg()
+        client_state = message.rerun_script
+        client_state.widget_states.widgets.extend(states)
+        client_state.cached_message_hashes.extend(self.cached_hashes)
+        if fragment_id:
+            client_state.fragment_id = fragment_id
+        started = time.perf_counter()
+        await self.connection.send(message.SerializeToString())
+        received, self.elements = 0, []
+        while True:
+            data = await self.connection.recv()
+            received += len(data)
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            if forward.metadata.cacheable:
+                self.cached_hashes.add(forward.hash)
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                self._record(forward.delta)
+            elif kind == "script_finished":
+                return time.perf_counter() - started, received
+
+    def _record(self, delta):
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        self.elements.append(element)
+        if kind in WIDGETS:
+            widget = Widget(kind, getattr(element, kind), delta.fragment_id)
+            self.widgets[widget.label] = widget
+
+    def state(self, label, **value):
+        widget = self.widgets[label]
+        message = BackMsg().rerun_script.widget_states.widgets.add()
+        message.id = widget.id
+        for name, data in value.items():
+            if name == "string_array_value":
+                message.string_array_value.data.extend(data)
+            elif name == "int_array_value":
+                message.int_array_value.data.extend(data)
+            else:
+                setattr(message, name, data)
+        return message
+
+    def has_text(self, text):
+        return any(text in str(element) for element in self.elements)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app, port, tokens):
+    env = dict(os.environ, EDUADOCS_FAKE_LLM="1", EDUADOCS_FAKE_TTFT="0", EDUADOCS_FAKE_TOKEN_LATENCY="0",
+               EDUADOCS_FAKE_TOKENS=str(tokens), EDUADOCS_DATA_DIR=tempfile.mkdtemp())
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", app, "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Streamlit did not start")
+
+
+def summary(samples):
+    times = [seconds * 1000 for seconds, _ in samples]
+    sizes = [size / 1024 for _, size in samples]
+    return (f"median {statistics.median(times):7.1f} ms  max {max(times):7.1f} ms  "
+            f"payload {statistics.median(sizes):7.1f} KiB")
+
+
+async def measure(port, runs):
+    connection = await connect(f"ws://127.0.0.1:{port}/_stcore/stream", max_size=None)
+    session = Session(connection)
+    await session.rerun()
+
+    # Submit the form and wait for the draft
+    await session.rerun([session.state("📚 Subject:", string_value="Biology"),
+                         session.state("🎯 Topic:", string_value="Photosynthesis"),
+                         session.state("🚀 Generate Draft", trigger_value=True)])
+    deadline = time.monotonic() + 120
+    while "Make your modifications:" not in session.widgets or not session.has_text("Make your modifications:"):
+        if time.monotonic() > deadline:
+            raise RuntimeError("The draft was not generated")
+        await asyncio.sleep(0.3)
+        await session.rerun()
+    draft = session.widgets["Make your modifications:"]
+    draft_text = next(element.text_area.default for element in session.elements
+                      if element.WhichOneof("type") == "text_area")
+    print(f"draft: {len(draft_text) / 1024:.0f} KiB, about {len(draft_text.split()) / 500:.0f} pages")
+
+    samples = [await session.rerun() for _ in range(runs)]
+    print(f"draft page    rerun: {summary(samples)}")
+    samples = [await session.rerun([session.state(draft.label, string_value=f"{draft_text}\nEdit {i}.")],
+                                   draft.fragment_id or None) for i in range(runs)]
+    print(f"draft page    edit:  {summary(samples)}{'  (fragment)' if draft.fragment_id else ''}")
+
+    await session.rerun([session.state("✅ Approve Draft", trigger_value=True)], draft.fragment_id or None)
+    while "Document Style:" not in session.widgets or not session.has_text("Document Style:"):
+        await session.rerun()
+    style = session.widgets["Document Style:"]
+    samples = [await session.rerun() for _ in range(runs)]
+    print(f"approved page rerun: {summary(samples)}")
+    samples = [await session.rerun([session.state(style.label, int_value=i % 2)], style.fragment_id or None)
+               for i in range(runs)]
+    print(f"approved page style: {summary(samples)}{'  (fragment)' if style.fragment_id else ''}")
+    await connection.close()
+
+
+def measure_previews(sections):
+    """Cold and memoized cost of the page's Markdown preview and content statistics"""
+    import rendering
+    from bench_rendering import build_document
+
+    content = build_document(sections)
+    for name, function in (("preview html", rendering.preview_html), ("content stats", rendering.content_stats)):
+        started = time.perf_counter()
+        function(content)
+        cold = time.perf_counter() - started
+        started = time.perf_counter()
+        function(content)
+        warm = time.perf_counter() - started
+        print(f"{name:<14} cold {cold * 1000:7.1f} ms  memoized {warm * 1000:6.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=13000, help="fake draft length, 13000 is about 30 pages")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--app", default=os.path.join(HERE, "..", "src", "stui.py"))
+    parser.add_argument("--sections", type=int, default=50, help="sections of the in-process preview document")
+    args = parser.parse_args()
+
+    measure_previews(args.sections)
+
+    port = free_port()
+    server = start_server(args.app, port, args.tokens)
+    try:
+        asyncio.run(measure(port, args.runs))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
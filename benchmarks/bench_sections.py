@@ -0,0 +1,70 @@
+"""Tokens and wall-clock time of regenerating a whole draft against regenerating some of its sections.
+
+    python benchmarks/bench_sections.py --tokens 6000 --sections 1 3
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from llm import FakeClient  # noqa: E402
+from regeneration import SectionRegenerator  # noqa: E402
+from sections import split_sections  # noqa: E402
+
+FORM_DATA = {
+    'document_type': "Summary",
+    'subject': "Biology",
+    'topic': "Photosynthesis",
+    'audience': "High School",
+    'language': "English"
+}
+
+
+class CountingClient(FakeClient):
+    """FakeClient counting the prompt characters it receives and the chunks it streams"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.prompt_characters = 0
+        self.tokens = 0
+
+    def stream(self, prompt, cancel_event=None):
+        self.prompt_characters += len(prompt)
+        for token in super().stream(prompt, cancel_event):
+            self.tokens += 1
+            yield token
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=6000, help="length of the full draft in chunks")
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated seconds to the first token")
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--sections", type=int, nargs="+", default=[1, 3], help="numbers of sections to regenerate")
+    args = parser.parse_args()
+
+    def client():
+        return CountingClient(first_token_latency=args.latency, token_latency=args.token_latency,
+                              output_tokens=args.tokens)
+
+    full = client()
+    started = time.perf_counter()
+    draft = full.generate(f"{FORM_DATA['subject']}: {FORM_DATA['topic']}")
+    elapsed = time.perf_counter() - started
+    print(f"{len(split_sections(draft))} sections, {len(draft) / 1024:.0f} KiB")
+    print(f"full draft        wall={elapsed:6.2f}s  tokens={full.tokens:6d}  prompt={full.prompt_characters:6d} chars")
+
+    for count in args.sections:
+        partial = client()
+        regenerator = SectionRegenerator(partial, FORM_DATA)
+        started = time.perf_counter()
+        regenerator.regenerate(draft, range(1, count + 1))
+        elapsed = time.perf_counter() - started
+        print(f"{count:>2} section(s)     wall={elapsed:6.2f}s  tokens={partial.tokens:6d}  "
+              f"prompt={partial.prompt_characters:6d} chars")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Wall-clock time of a large exercise list: one model call against concurrent shards.
+
+    python benchmarks/bench_sharding.py --exercises 50 --token-latency 0.005
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from llm import FakeClient, LLMError  # noqa: E402
+from sharding import ShardedGenerator, Shard, parse_exercises, run_sharded_draft_job  # noqa: E402
+
+FORM_DATA = {
+    'document_type': "Exercise List",
+    'subject': "Mathematics",
+    'topic': "Fractions",
+    'details': "",
+    'context': "",
+    'audience': "Middle School",
+    'language': "English",
+    'difficulty': "Intermediate",
+    'exercise_types': ["Multiple Choice", "Problem Solving", "Short Answer"]
+}
+
+
+class ExerciseClient(FakeClient):
+    """FakeClient replying with the number of exercises the prompt asks for, every `fail_every`-th call failing"""
+
+    def __init__(self, fail_every=0, tokens_per_exercise=40, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_every = fail_every
+        self.tokens_per_exercise = tokens_per_exercise
+        self.calls = 0
+
+    def stream(self, prompt, cancel_event=None):
+        self.calls += 1
+        if self.fail_every and self.calls % self.fail_every == 0:
+            raise LLMError("simulated 503", retryable=True)
+        return super().stream(prompt, cancel_event)
+
+    def _tokens(self, prompt):
+        match = re.search(r"exactly (\d+)", prompt)
+        count = int(match.group(1)) if match else 50
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        for i in range(count):
+            yield f"### Exercise {i + 1}\n\nCompute {seed}-{i}: "
+            for _ in range(self.tokens_per_exercise - 2):
+                yield "step "
+            yield f"\n\n**Answer:** {i}\n\n"
+
+
+class Job:
+    cancelled = False
+
+    def update(self, **kwargs):
+        pass
+
+    def check_cancelled(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--exercises", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated seconds to the first token")
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--tokens-per-exercise", type=int, default=40)
+    parser.add_argument("--fail-every", type=int, default=5, help="every Nth call fails with a retryable error")
+    parser.add_argument("--shard-sizes", type=int, nargs="+", default=[5, 10, 25])
+    args = parser.parse_args()
+    form_data = {**FORM_DATA, 'num_exercises': args.exercises}
+
+    def client():
+        return ExerciseClient(args.fail_every, args.tokens_per_exercise, first_token_latency=args.latency,
+                              token_latency=args.token_latency)
+
+    single = client()
+    started = time.perf_counter()
+    text = single.generate(f"Write exactly {args.exercises} exercises")
+    elapsed = time.perf_counter() - started
+    print(f"single call         wall={elapsed:6.2f}s  exercises={len(parse_exercises(text, 'Mixed'))}")
+
+    for shard_size in args.shard_sizes:
+        generator = ShardedGenerator(client(), form_data, shard_size=shard_size, backoff=0.05)
+        started = time.perf_counter()
+        result = run_sharded_draft_job(Job(), generator)
+        elapsed = time.perf_counter() - started
+        stats = result['shards']
+        shard_latency = generator.generate_shard(Shard(0, "Mixed", shard_size)).elapsed
+        print(f"shards of {shard_size:>3}     wall={elapsed:6.2f}s  exercises={stats['exercises']}  "
+              f"shards={stats['shards']}  retries={stats['retries']}  one shard={shard_latency:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
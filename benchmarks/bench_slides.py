@@ -0,0 +1,84 @@
+"""PPTX export of long documents: time per slide and peak Python memory for decks of hundreds of slides.
+
+    python benchmarks/bench_slides.py --sections 50 150 300
+
+Each size is rendered cold into the file the export job returns, which is then
+copied into the job store in chunks, and rendered again, which decks up to
+EDUADOCS_SPOOL_MAX_BYTES serve from the render memo. Peak memory is measured on
+a third render written to a file on disk, so it is the renderer's working memory
+without the deck; it is what tracemalloc sees allocated by Python, so it excludes
+the libraries' C buffers.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, HERE)
+os.environ.setdefault("EDUADOCS_DATA_DIR", tempfile.mkdtemp())
+
+from bench_rendering import build_document  # noqa: E402
+from jobs import JobQueue  # noqa: E402
+from rendering import (FILE_RENDERERS, RenderOptions, parse_document, render_document,  # noqa: E402
+                       render_document_file)
+
+
+def timed(function, *args):
+    """Return (result, seconds spent calling `function`)"""
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def peak_memory(content, options):
+    """Peak MiB allocated by Python while rendering `content` into a file on disk"""
+    blocks = parse_document(content)
+    with tempfile.TemporaryFile() as output:
+        tracemalloc.start()
+        FILE_RENDERERS[options.extension](blocks, options, output)
+        peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    return peak
+
+
+def slide_count(data):
+    from pptx import Presentation
+    return len(Presentation(io.BytesIO(data)).slides)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, nargs="+", default=[50, 150, 300])
+    parser.add_argument("--style", default="Professional")
+    args = parser.parse_args()
+    options = RenderOptions("PPTX (Slides)", args.style, "12pt", True, True, "Biology: Photosynthesis",
+                            "Summary · High School")
+    queue = JobQueue(path=os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"), max_workers=1)
+
+    # The first render pays for importing python-pptx
+    render_document(build_document(1), options)
+    for sections in args.sections:
+        content = build_document(sections)
+        output, elapsed = timed(render_document_file, content, options)
+        rolled = getattr(output, "_rolled", False)
+        size = output.seek(0, os.SEEK_END)
+        output.seek(0)
+        job_id = queue.submit("export", lambda job: output)
+        started = time.perf_counter()
+        while queue.get(job_id)['status'] != "done":
+            time.sleep(0.01)
+        stored = time.perf_counter() - started
+        slides = slide_count(queue.result(job_id))
+        _, again = timed(render_document, content, options)
+        print(f"{sections:>4} sections  {slides:>5} slides  {size / 1024 / 1024:6.1f} MiB{' (on disk)' if rolled else ''}  "
+              f"render {elapsed:6.2f}s ({elapsed / slides * 1000:4.1f} ms/slide)  stored {stored:5.2f}s  "
+              f"again {again * 1000:6.1f} ms  peak {peak_memory(content, options):5.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
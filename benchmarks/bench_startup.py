@@ -0,0 +1,115 @@
+"""Cold-start cost: import time per module and the first page load, each in a fresh interpreter.
+
+    python benchmarks/bench_startup.py --repeat 5 --output startup.json
+    python benchmarks/bench_startup.py --baseline startup.json
+
+Each module is imported alone under `python -X importtime` and the best of
+--repeat runs is kept, with its heaviest dependencies. The first page load runs
+the app once through AppTest with background warmup off and lists the optional
+libraries it pulled in, which should be none.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, "..", "src")
+sys.path.insert(0, HERE)
+
+APP_MODULES = ["doc_config", "instrumentation", "cache", "artifacts", "jobs", "llm", "drafts", "crews",
+               "corrections", "extraction", "sharding", "sections", "regeneration", "rendering",
+               "translation", "library", "warmup", "batch", "stui"]
+OPTIONAL_MODULES = ["streamlit", "docx", "fpdf", "pypdf", "pptx"]
+
+FIRST_PAGE = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=60).run()
+finished = time.perf_counter()
+print(json.dumps({
+    'streamlit_import_ms': (imported - started) * 1000,
+    'first_run_ms': (finished - imported) * 1000,
+    'errors': [error.message for error in at.exception],
+    'optional_loaded': [name for name in sys.argv[2:] if name in sys.modules]
+}))
+"""
+
+
+def import_profile(module):
+    """Return (cumulative microseconds, [(self microseconds, dependency)]) for importing `module` cold"""
+    env = dict(os.environ, PYTHONPATH=SRC, EDUADOCS_DATA_DIR=tempfile.mkdtemp())
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env, cwd=SRC)
+    if result.returncode:
+        return None, []
+    # Nested imports are printed before the module that triggered them, indented one more space
+    subtree = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if name.startswith("  "):
+            subtree.append((int(self_us), name.strip()))
+        elif name.strip() == module:
+            return int(cumulative_us), sorted(subtree, reverse=True)
+        else:
+            subtree = []
+    return None, []
+
+
+def first_page():
+    env = dict(os.environ, EDUADOCS_DATA_DIR=tempfile.mkdtemp(), EDUADOCS_WARMUP="0", EDUADOCS_FAKE_LLM="1")
+    result = subprocess.run([sys.executable, "-c", FIRST_PAGE, os.path.join(SRC, "stui.py"), *OPTIONAL_MODULES[1:]],
+                            capture_output=True, text=True, env=env, cwd=SRC)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="cold imports per module, the best is kept")
+    parser.add_argument("--top", type=int, default=3, help="heaviest dependencies shown per module")
+    parser.add_argument("--modules", nargs="+", default=APP_MODULES + OPTIONAL_MODULES)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON from a previous --output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    results = {'import_ms': {}}
+    for module in args.modules:
+        profiles = [import_profile(module) for _ in range(args.repeat)]
+        total, dependencies = min(profiles, key=lambda profile: profile[0] or float("inf"))
+        if total is None:
+            print(f"{module:<18} not installed")
+            continue
+        results['import_ms'][module] = total / 1000
+        heaviest = ", ".join(f"{name} {self_us / 1000:.0f}" for self_us, name in dependencies[:args.top])
+        print(f"{module:<18}{total / 1000:8.1f} ms   ({heaviest})")
+
+    page = first_page()
+    results.update(first_run_ms=page['first_run_ms'], streamlit_import_ms=page['streamlit_import_ms'])
+    print(f"\n{'streamlit testing':<18}{page['streamlit_import_ms']:8.1f} ms")
+    print(f"{'first page run':<18}{page['first_run_ms']:8.1f} ms   "
+          f"optional libraries loaded: {', '.join(page['optional_loaded']) or 'none'}")
+    if page['errors']:
+        print(f"first page errors: {page['errors']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        from bench_app import compare
+
+        with open(args.baseline, encoding="utf-8") as baseline:
+            regressions = list(compare(results, json.load(baseline), args.tolerance))
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.1f} -> {after:.1f} ms")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict, deque
+
+from cache import content_hash
+from doc_config import DATA_DIR
+
+
+class ArtifactRef:
+    """Small handle kept in session state in place of a document or upload.
+
+    The store counts live handles per artifact. A handle gives its reference back
+    when it is released, or when it is garbage collected with an expired session.
+    """
+
+    __slots__ = ("key", "size", "_finalizer", "__weakref__")
+
+    def __init__(self, store, key, size):
+        self.key = key
+        self.size = size
+        self._finalizer = weakref.finalize(self, store._pending_releases.append, key)
+
+    def release(self):
+        self._finalizer()
+
+    def __repr__(self):
+        return f"ArtifactRef({self.key[:13]}, {self.size} bytes)"
+
+
+class ArtifactStore:
+    """Content-addressed, zlib-compressed artifacts shared by all sessions.
+
+    Identical content is stored once however many sessions hold it. Compressed
+    artifacts are kept in memory up to `max_bytes`, least recently used first
+    out, and every artifact is also written to SQLite so an evicted one can be
+    reloaded. Artifacts without live handles are deleted once unused for `ttl`.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=24 * 3600, path=None, level=6):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.level = level
+        self.path = path or os.path.join(DATA_DIR, "artifacts.sqlite3")
+        self.memory_bytes = 0
+        self.puts = 0
+        self.deduplicated = 0
+        self.disk_loads = 0
+        self._memory = OrderedDict()
+        self._refs = {}
+        # Filled by handle finalizers, which may run in any thread during garbage collection
+        self._pending_releases = deque()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                key TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    def put(self, value):
+        """Store a str or bytes value and return a new `ArtifactRef` to it"""
+        is_text = isinstance(value, str)
+        data = value.encode("utf-8") if is_text else value
+        key = ("t" if is_text else "b") + content_hash(data)
+        with self._lock:
+            self._apply_releases()
+            self.puts += 1
+            exists = key in self._memory or self._db.execute(
+                "UPDATE artifacts SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            ).rowcount
+            if exists:
+                self.deduplicated += 1
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+            else:
+                compressed = zlib.compress(data, self.level)
+                self._db.execute("INSERT INTO artifacts (key, data, size, accessed_at) VALUES (?, ?, ?, ?)",
+                                 (key, compressed, len(data), time.time()))
+                self._remember(key, compressed)
+                if self.puts % 100 == 0:
+                    self._purge()
+            self._db.commit()
+            self._refs[key] = self._refs.get(key, 0) + 1
+        return ArtifactRef(self, key, len(data))
+
+    def get(self, ref):
+        """Return the value behind `ref` (an `ArtifactRef` or its key), or None if it expired"""
+        key = ref.key if isinstance(ref, ArtifactRef) else ref
+        with self._lock:
+            compressed = self._memory.get(key)
+            if compressed is not None:
+                self._memory.move_to_end(key)
+            else:
+                row = self._db.execute("SELECT data FROM artifacts WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                compressed = row[0]
+                self.disk_loads += 1
+                self._db.execute("UPDATE artifacts SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                self._remember(key, compressed)
+                self._db.commit()
+        data = zlib.decompress(compressed)
+        return data.decode("utf-8") if key.startswith("t") else data
+
+    def purge_expired(self):
+        """Delete unreferenced artifacts unused for `ttl` and return how many were removed"""
+        with self._lock:
+            self._apply_releases()
+            removed = self._purge()
+            self._db.commit()
+        return removed
+
+    def stats(self):
+        with self._lock:
+            self._apply_releases()
+            return {
+                'memory_items': len(self._memory),
+                'memory_bytes': self.memory_bytes,
+                'referenced': len(self._refs),
+                'handles': sum(self._refs.values()),
+                'puts': self.puts,
+                'deduplicated': self.deduplicated,
+                'disk_loads': self.disk_loads
+            }
+
+    def _remember(self, key, compressed):
+        self._memory[key] = compressed
+        self.memory_bytes += len(compressed)
+        while self.memory_bytes > self.max_bytes and len(self._memory) > 1:
+            evicted, data = self._memory.popitem(last=False)
+            self.memory_bytes -= len(data)
+            # Memory hits do not touch the database, so record the last use on the way out
+            self._db.execute("UPDATE artifacts SET accessed_at = ? WHERE key = ?", (time.time(), evicted))
+
+    def _apply_releases(self):
+        while self._pending_releases:
+            key = self._pending_releases.popleft()
+            count = self._refs.get(key, 0) - 1
+            if count > 0:
+                self._refs[key] = count
+            else:
+                self._refs.pop(key, None)
+
+    def _purge(self):
+        # Artifacts still in memory were used recently enough to keep
+        cutoff = time.time() - self.ttl
+        expired = [key for (key,) in self._db.execute("SELECT key FROM artifacts WHERE accessed_at <= ?", (cutoff,))
+                   if key not in self._refs and key not in self._memory]
+        self._db.executemany("DELETE FROM artifacts WHERE key = ?", [(key,) for key in expired])
+        return len(expired)
+
+
+_artifact_store = None
+_artifact_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Return the process-wide artifact store shared by all Streamlit sessions"""
+    global _artifact_store
+    with _artifact_store_lock:
+        if _artifact_store is None:
+            _artifact_store = ArtifactStore(
+                max_bytes=int(float(os.environ.get("EDUADOCS_ARTIFACT_MEMORY_MB", "64")) * 1024 * 1024),
+                ttl=float(os.environ.get("EDUADOCS_ARTIFACT_TTL", str(24 * 3600)))
+            )
+        return _artifact_store
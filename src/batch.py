@@ -0,0 +1,203 @@
+"""Generate and export many documents headlessly from a JSON-lines spec file.
+
+    python src/batch.py term.jsonl --output out/ --format docx --workers 4
+
+Each line holds the fields of the content form: document_type, subject, topic,
+and optionally details, context, audience, language and llm_provider (plus
+num_exercises, difficulty and exercise_types for exercise lists). Provider
+settings come from the environment under the sidebar's names, e.g.
+EDUADOCS_OPENAI_KEY, EDUADOCS_OPENAI_MODEL or EDUADOCS_OLLAMA_ENDPOINT.
+
+Documents are generated in a process pool. Every finished item is appended to
+`manifest.jsonl` in the output directory, so running the same command again
+after an interruption only generates what is missing. Drafts already in the
+shared draft cache are rendered without calling the model again.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cache import draft_key, get_draft_cache
+from crews import run_crew_draft_job
+from doc_config import DocumentType, LLMProvider
+from instrumentation import get_metrics
+from jobs import Job
+from llm import PROVIDER_SETTINGS, get_client
+from rendering import OUTPUT_FORMATS, STYLES, RenderOptions, render_document
+from sharding import ShardedGenerator, run_sharded_draft_job, should_shard
+
+MANIFEST = "manifest.jsonl"
+REQUIRED_FIELDS = ('document_type', 'subject', 'topic')
+FORMATS = {extension: name for name, (extension, _) in OUTPUT_FORMATS.items()}
+
+
+class SpecError(ValueError):
+    pass
+
+
+def settings_from_env():
+    """Sidebar settings for every provider, read from EDUADOCS_<SETTING> variables"""
+    names = {name for setting in PROVIDER_SETTINGS.values() for name in setting[:2] if name}
+    names.add("ollama_endpoint")
+    return {name: os.environ[f"EDUADOCS_{name.upper()}"] for name in names
+            if os.environ.get(f"EDUADOCS_{name.upper()}")}
+
+
+def read_specs(path, defaults):
+    """Yield (line number, form_data) for each record, with `defaults` filling missing fields"""
+    with open(path, encoding="utf-8") as specs:
+        for number, line in enumerate(specs, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise SpecError(f"line {number}: {e}") from e
+            missing = [field for field in REQUIRED_FIELDS if not record.get(field)]
+            if missing:
+                raise SpecError(f"line {number}: missing {', '.join(missing)}")
+            form_data = {**defaults, **record}
+            if form_data['document_type'] not in (DocumentType.SUMMARY.value, DocumentType.EXERCISES.value):
+                raise SpecError(f"line {number}: {form_data['document_type']!r} cannot be generated in batch mode")
+            LLMProvider(form_data['llm_provider'])
+            yield number, form_data
+
+
+def read_manifest(directory):
+    """Return {item key: entry} for the items a previous run finished"""
+    done = {}
+    path = os.path.join(directory, MANIFEST)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as manifest:
+            for line in manifest:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write leaves a partial last line
+                    continue
+                if entry['status'] == "done" and os.path.exists(os.path.join(directory, entry['file'])):
+                    done[entry['key']] = entry
+    return done
+
+
+def file_name(number, form_data, extension):
+    stem = "_".join(re.sub(r"[^\w-]+", "-", form_data[field]).strip("-")
+                    for field in ('subject', 'topic', 'language'))
+    return f"{number:04d}_{stem}.{extension}"
+
+
+def options_key(options):
+    return "-".join(str(value) for _, value in sorted(options.items()))
+
+
+def init_worker():
+    """Process pool initializer: workers append to the metrics log but do not write metrics.prom"""
+    # Each worker would otherwise overwrite the snapshot with only its own counts
+    get_metrics().snapshot = False
+
+
+def generate_document(form_data, settings, options, path):
+    """Worker: draft `form_data` with the app's pipeline and render it to `path`"""
+    started = time.perf_counter()
+    cache_key = draft_key(form_data, settings)
+    text = get_draft_cache().get(cache_key)
+    if text is None:
+        client = get_client(form_data['llm_provider'], settings)
+        # The job functions only need a Job for progress reports, which nobody polls here
+        job = Job(cache_key[:12], "batch", {})
+        if should_shard(form_data):
+            text = run_sharded_draft_job(job, ShardedGenerator(client, form_data), cache_key)['text']
+        else:
+            text = run_crew_draft_job(job, client, form_data, cache_key)['text']
+    data = render_document(text, RenderOptions(
+        title=f"{form_data['subject']}: {form_data['topic']}",
+        subtitle=f"{form_data['document_type']} · {form_data['audience']}",
+        **options
+    ))
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as output:
+        output.write(data)
+    os.replace(temporary, path)
+    return time.perf_counter() - started
+
+
+def run_batch(specs, directory, options, workers, settings):
+    """Generate every spec not already in the manifest; return (done, failed, skipped, seconds)"""
+    os.makedirs(directory, exist_ok=True)
+    finished = read_manifest(directory)
+    extension = OUTPUT_FORMATS[options['output_format']][0]
+    pending, skipped = [], 0
+    for number, form_data in specs:
+        key = draft_key(form_data, settings) + "-" + options_key(options)
+        if key in finished:
+            skipped += 1
+        else:
+            pending.append((number, form_data, key, file_name(number, form_data, extension)))
+    print(f"{len(pending)} to generate, {skipped} already done", file=sys.stderr)
+
+    done = failed = 0
+    started = time.perf_counter()
+    with open(os.path.join(directory, MANIFEST), "a", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures = {executor.submit(generate_document, form_data, settings, options, os.path.join(directory, name)):
+                   (number, key, name) for number, form_data, key, name in pending}
+        try:
+            for future in as_completed(futures):
+                number, key, name = futures[future]
+                entry = {'key': key, 'line': number, 'file': name}
+                try:
+                    entry.update(status="done", seconds=round(future.result(), 3))
+                    done += 1
+                except Exception as e:
+                    entry.update(status="failed", error=str(e) or type(e).__name__)
+                    failed += 1
+                manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                manifest.flush()
+                status = f"failed: {entry['error']}" if 'error' in entry else f"{name} in {entry['seconds']:.1f}s"
+                rate = done / (time.perf_counter() - started) * 60
+                print(f"[{done + failed}/{len(pending)}] line {number}: {status} ({rate:.1f} docs/min)",
+                      file=sys.stderr)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    return done, failed, skipped, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("specs", help="JSON-lines file with one content form per line")
+    parser.add_argument("--output", "-o", default="batch_output", help="directory for documents and the manifest")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="docx")
+    parser.add_argument("--style", choices=sorted(STYLES), default="Academic")
+    parser.add_argument("--font-size", default="12pt")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--provider", default=LLMProvider.OLLAMA.value,
+                        help="llm_provider for records without one")
+    parser.add_argument("--language", default="English", help="language for records without one")
+    parser.add_argument("--audience", default="High School", help="audience for records without one")
+    args = parser.parse_args()
+
+    defaults = {'details': "", 'context': "", 'audience': args.audience, 'language': args.language,
+                'llm_provider': args.provider}
+    options = {'output_format': FORMATS[args.format], 'template_style': args.style, 'font_size': args.font_size}
+    try:
+        specs = list(read_specs(args.specs, defaults))
+    except (OSError, SpecError, ValueError) as e:
+        parser.error(str(e))
+
+    try:
+        done, failed, skipped, seconds = run_batch(specs, args.output, options, args.workers, settings_from_env())
+    except KeyboardInterrupt:
+        print("Interrupted, run the same command again to resume.", file=sys.stderr)
+        sys.exit(130)
+    rate = done / seconds * 60 if seconds else 0.0
+    print(f"{done} generated, {failed} failed, {skipped} skipped in {seconds:.1f}s ({rate:.1f} docs/min)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
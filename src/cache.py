@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from doc_config import DATA_DIR, LLMProvider
+
+MODEL_SETTINGS = {
+    LLMProvider.OPENAI.value: 'openai_model',
+    LLMProvider.GOOGLE.value: 'google_model',
+    LLMProvider.HUGGINGFACE.value: 'hf_model',
+    LLMProvider.OLLAMA.value: 'ollama_model'
+}
+
+
+def content_hash(data):
+    """Return the sha256 hex digest of `data` (str or bytes)"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if v not in (None, "", [])}
+    if isinstance(value, (list, tuple)):
+        return sorted(_normalize(v) for v in value)
+    return value
+
+
+def draft_key(form_data, settings):
+    """Hash the normalized form data and the selected provider's model setting.
+
+    Whitespace and case differences in the free-text fields map to the same key,
+    and only the model of the chosen provider takes part since the others do not
+    affect the generated draft. The library `reference` is left out so the key of
+    a request does not change whenever a document is approved.
+    """
+    model_setting = MODEL_SETTINGS.get(form_data.get('llm_provider'))
+    payload = {
+        'form_data': _normalize({k: v for k, v in form_data.items() if k != 'reference'}),
+        'model': settings.get(model_setting) if model_setting else None,
+        'fake': bool(os.environ.get("EDUADOCS_FAKE_LLM"))
+    }
+    return content_hash(json.dumps(payload, sort_keys=True, ensure_ascii=False))
+
+
+class TieredCache:
+    """Size-bounded in-process LRU in front of a SQLite store with TTL eviction.
+
+    Values are str or bytes. The store is safe to share between the threads that
+    serve Streamlit sessions and between processes using the same database file.
+    """
+
+    def __init__(self, namespace, max_items=256, ttl=7 * 24 * 3600, path=None):
+        self.namespace = namespace
+        self.max_items = max_items
+        self.ttl = ttl
+        self.path = path or os.path.join(DATA_DIR, "cache.sqlite3")
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._db.commit()
+
+    def get(self, key):
+        """Return the cached value for `key`, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._db.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                    self._db.commit()
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, value, expires_at)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            self._db.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+            self._db.commit()
+
+    def purge_expired(self):
+        """Drop expired entries from both tiers and return how many rows were removed on disk"""
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (_, expires_at) in self._memory.items() if expires_at <= now]:
+                del self._memory[key]
+            removed = self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+            self._db.commit()
+        return removed
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            'memory_items': len(self._memory)
+        }
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+
+_draft_cache = None
+_draft_cache_lock = threading.Lock()
+
+
+def get_draft_cache():
+    """Return the process-wide draft cache shared by all Streamlit sessions"""
+    global _draft_cache
+    with _draft_cache_lock:
+        if _draft_cache is None:
+            _draft_cache = TieredCache(
+                "drafts",
+                max_items=int(os.environ.get("EDUADOCS_DRAFT_CACHE_ITEMS", "256")),
+                ttl=float(os.environ.get("EDUADOCS_DRAFT_CACHE_TTL", str(7 * 24 * 3600)))
+            )
+        return _draft_cache
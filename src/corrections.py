@@ -0,0 +1,223 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cache import get_draft_cache
+from doc_config import LLMProvider
+from extraction import ExtractionError, chunk_text, extract_text
+from llm import LLMError
+
+# Requests per minute allowed per provider, shared by every session in the process
+RATE_LIMITS = {
+    LLMProvider.OPENAI.value: 500,
+    LLMProvider.GOOGLE.value: 60,
+    LLMProvider.HUGGINGFACE.value: 30,
+    LLMProvider.OLLAMA.value: None
+}
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per `per` seconds with bursts up to `burst`"""
+
+    def __init__(self, rate, per=60.0, burst=None):
+        self.interval = per / rate
+        self.capacity = burst or max(1, int(rate / per))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) / self.interval)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider):
+    """Return the shared limiter for `provider`, or None when it is not rate limited"""
+    rate = RATE_LIMITS.get(provider)
+    if not rate:
+        return None
+    with _rate_limiters_lock:
+        if provider not in _rate_limiters:
+            _rate_limiters[provider] = RateLimiter(rate)
+        return _rate_limiters[provider]
+
+
+def generate_with_retry(client, prompt, max_retries=3, backoff=1.0, rate_limiter=None, cancel_event=None):
+    """Return (text, attempts, error), retrying transient errors with jittered exponential backoff"""
+    attempt = 0
+    while True:
+        attempt += 1
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return client.generate(prompt, cancel_event=cancel_event), attempt, None
+        except LLMError as e:
+            if not e.retryable or attempt > max_retries:
+                return None, attempt, str(e)
+        delay = backoff * 2 ** (attempt - 1)
+        delay += random.uniform(0, delay / 2)
+        if cancel_event is not None:
+            if cancel_event.wait(delay):
+                return None, attempt, "Cancelled"
+        else:
+            time.sleep(delay)
+
+
+class Submission:
+    """A student submission given either as extracted `text` or as the raw uploaded `data`"""
+
+    def __init__(self, name, text=None, data=None):
+        self.name = name
+        self.text = text
+        self.data = data
+
+    def chunks(self):
+        """Return the submission text split to fit the model context"""
+        if self.text is None:
+            self.text = extract_text(self.name, self.data)
+        return chunk_text(self.text)
+
+
+class CorrectionResult:
+    def __init__(self, name, feedback=None, error=None, attempts=0, elapsed=0.0):
+        self.name = name
+        self.feedback = feedback
+        self.error = error
+        self.attempts = attempts
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def build_correction_prompt(form_data, submission, chunk, part=1, parts=1):
+    heading = f"Correction of {submission.name}"
+    if parts > 1:
+        heading += f" (part {part} of {parts}, grade only this part)"
+    return "\n".join([
+        heading,
+        "",
+        f"You are grading a {form_data['audience']} student's work in {form_data['subject']} "
+        f"on the topic '{form_data['topic']}'.",
+        f"{form_data['details']}",
+        f"Write the feedback in {form_data['language']} using Markdown: a score, what was done well, "
+        "the mistakes with their corrections, and one suggestion for improvement.",
+        "Do not use top-level '#' headings.",
+        "",
+        "Student submission:",
+        chunk
+    ])
+
+
+class CorrectionEngine:
+    """Grade submissions concurrently through a bounded worker pool with retry and backoff"""
+
+    def __init__(self, client, form_data, max_workers=None, max_retries=3, backoff=1.0, rate_limiter=None):
+        self.client = client
+        self.form_data = form_data
+        self.max_workers = max_workers or int(os.environ.get("EDUADOCS_CORRECTION_WORKERS", "8"))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = rate_limiter
+
+    def correct(self, submission, cancel_event=None):
+        """Grade one submission, retrying transient provider errors with exponential backoff"""
+        started = time.perf_counter()
+        try:
+            chunks = submission.chunks()
+        except ExtractionError as e:
+            return CorrectionResult(submission.name, error=str(e))
+        if not chunks:
+            return CorrectionResult(submission.name, error="No text could be extracted from this file.")
+
+        feedback, attempts = [], 0
+        for part, chunk in enumerate(chunks, start=1):
+            prompt = build_correction_prompt(self.form_data, submission, chunk, part, len(chunks))
+            text, tries, error = self._generate(prompt, cancel_event)
+            attempts += tries
+            if error is not None:
+                return CorrectionResult(submission.name, error=error, attempts=attempts,
+                                        elapsed=time.perf_counter() - started)
+            feedback.append(text if len(chunks) == 1 else f"### Part {part}\n\n{text.strip()}")
+        return CorrectionResult(submission.name, feedback="\n\n".join(feedback), attempts=attempts,
+                                elapsed=time.perf_counter() - started)
+
+    def _generate(self, prompt, cancel_event):
+        return generate_with_retry(self.client, prompt, self.max_retries, self.backoff, self.rate_limiter,
+                                   cancel_event)
+
+    def run(self, submissions):
+        """Yield a `CorrectionResult` for each submission as soon as it finishes"""
+        cancel_event = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="correction")
+        try:
+            futures = [executor.submit(self.correct, submission, cancel_event) for submission in submissions]
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # Closing the generator early (e.g. a cancelled run) drops the queued work
+            cancel_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def aggregate_corrections(form_data, results):
+    """Combine per-submission results into one Markdown correction document"""
+    results = sorted(results, key=lambda result: result.name.lower())
+    graded = [result for result in results if result.ok]
+    lines = [
+        f"# {form_data['subject']}: {form_data['topic']} - Corrections",
+        "",
+        f"**Submissions:** {len(results)} · **Graded:** {len(graded)} · "
+        f"**Failed:** {len(results) - len(graded)}",
+        ""
+    ]
+    for result in results:
+        lines.append(f"## {result.name}")
+        lines.append("")
+        lines.append(result.feedback.strip() if result.ok else f"*Could not be graded: {result.error}*")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def run_correction_job(job, engine, submissions, cache_key=None):
+    """Job function: grade `submissions`, publishing each finished file as it completes"""
+    started = time.perf_counter()
+    results, finished = [], []
+    corrections = engine.run(submissions)
+    for result in corrections:
+        results.append(result)
+        finished.append({'name': result.name, 'ok': result.ok, 'elapsed': result.elapsed, 'error': result.error})
+        job.update(progress=len(results) / len(submissions), partial=list(finished),
+                   message=f"Corrected {len(results)} of {len(submissions)} submissions")
+        if job.cancelled:
+            corrections.close()
+            break
+    job.check_cancelled()
+
+    text = aggregate_corrections(engine.form_data, results)
+    if cache_key and all(result.ok for result in results):
+        get_draft_cache().set(cache_key, text)
+    return {
+        'text': text,
+        'stats': {
+            'submissions': len(results),
+            'failed': sum(1 for result in results if not result.ok),
+            'total_time': time.perf_counter() - started
+        }
+    }
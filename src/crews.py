@@ -0,0 +1,257 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from cache import TieredCache, content_hash
+from doc_config import DocumentType
+from drafts import build_prompt, run_draft_job
+from instrumentation import get_metrics
+
+
+class Agent:
+    """Role description in CrewAI's role/goal/backstory terms, used as the task's system preamble"""
+
+    def __init__(self, role, goal, backstory):
+        self.role = role
+        self.goal = goal
+        self.backstory = backstory
+
+    def preamble(self):
+        return f"You are the {self.role}. {self.backstory} Your goal: {self.goal}"
+
+
+AGENTS = {
+    'researcher': Agent("Subject Researcher", "collect the accurate key facts a teacher needs on the topic",
+                        "You are a meticulous subject-matter expert."),
+    'planner': Agent("Curriculum Planner", "turn the facts into learning objectives and a structure",
+                     "You design lessons that build understanding step by step."),
+    'writer': Agent("Educational Writer", "write clear material pitched at the target audience",
+                    "You write engaging, correct teaching material."),
+    'assessor': Agent("Assessment Designer", "write fair exercises and exact answer keys",
+                      "You write exercises that test understanding rather than memory.")
+}
+
+
+class Task:
+    """One node of a crew graph. `instructions` is formatted with the form data."""
+
+    def __init__(self, name, agent, instructions, depends_on=()):
+        self.name = name
+        self.agent = agent
+        self.instructions = instructions
+        self.depends_on = tuple(depends_on)
+
+    def prompt(self, form_data, inputs):
+        lines = [
+            AGENTS[self.agent].preamble(),
+            "",
+            self.instructions.format(**form_data),
+            f"Audience: {form_data['audience']}. Write in {form_data['language']}. Be concise."
+        ]
+        if form_data.get('details'):
+            lines.append(f"Requirements: {form_data['details']}")
+        for name in self.depends_on:
+            lines += ["", f"### {name.replace('_', ' ').title()} (from the team)", inputs[name]]
+        return "\n".join(lines)
+
+
+class TaskTiming:
+    def __init__(self, name, started, finished, cached=False):
+        self.name = name
+        self.started = started
+        self.finished = finished
+        self.cached = cached
+
+    @property
+    def duration(self):
+        return self.finished - self.started
+
+    def as_dict(self):
+        return {'name': self.name, 'started': self.started, 'finished': self.finished,
+                'duration': self.duration, 'cached': self.cached}
+
+
+class CrewRun:
+    """Outputs and timings of one graph execution. Times are seconds since the run started."""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.outputs = {}
+        self.timings = {}
+        self.started_at = time.perf_counter()
+
+    def record(self, name, started, finished, cached=False):
+        self.timings[name] = TaskTiming(name, started - self.started_at, finished - self.started_at, cached)
+
+    def critical_path(self):
+        """Return (task names, seconds) of the longest dependency chain by measured duration"""
+        cost, previous = {}, {}
+        for task in self.graph.order:
+            if task.name not in self.timings:
+                continue
+            heaviest = max((name for name in task.depends_on if name in cost), key=cost.get, default=None)
+            cost[task.name] = self.timings[task.name].duration + (cost[heaviest] if heaviest else 0.0)
+            previous[task.name] = heaviest
+        if not cost:
+            return [], 0.0
+        name = max(cost, key=cost.get)
+        total, path = cost[name], []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return path[::-1], total
+
+    def as_dict(self):
+        path, seconds = self.critical_path()
+        return {
+            'tasks': [self.timings[task.name].as_dict() for task in self.graph.order if task.name in self.timings],
+            'critical_path': path,
+            'critical_path_time': seconds
+        }
+
+
+class TaskGraph:
+    """Tasks wired by dependencies. Every task whose inputs are ready runs concurrently.
+
+    The last task in `order` is the sink: it writes the document from its inputs
+    and is streamed to the user instead of being run here.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = {task.name: task for task in tasks}
+        self.order = self._topological_order(tasks)
+        self.sink = self.order[-1]
+
+    @staticmethod
+    def _topological_order(tasks):
+        names = {task.name for task in tasks}
+        order, done, remaining = [], set(), list(tasks)
+        while remaining:
+            ready = [task for task in remaining if set(task.depends_on) <= done]
+            if not ready:
+                missing = {name for task in remaining for name in task.depends_on} - names
+                raise ValueError(f"Unknown dependencies {sorted(missing)}" if missing else "Task graph has a cycle")
+            for task in ready:
+                order.append(task)
+                done.add(task.name)
+                remaining.remove(task)
+        return order
+
+    def run(self, client, form_data, max_workers=4, cache=None, progress=None, cancel_event=None, use_cache=True):
+        """Run every task except the sink and return the `CrewRun`, stopping early once `cancel_event` is set.
+
+        With `use_cache` False every task calls the model again; its fresh outputs still replace the cached ones.
+        """
+        cache = cache or get_crew_cache()
+        run = CrewRun(self)
+        tasks = [task for task in self.order if task is not self.sink]
+        pending = {task.name: task for task in tasks}
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew")
+        running = {}
+        try:
+            while pending or running:
+                if cancel_event is not None and cancel_event.is_set():
+                    # Let the running tasks stop on the event, but start nothing new
+                    pending.clear()
+                for name, task in list(pending.items()):
+                    if all(dependency in run.outputs for dependency in task.depends_on):
+                        del pending[name]
+                        running[executor.submit(self._run_task, run, task, client, form_data, cache,
+                                                cancel_event, use_cache)] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    run.outputs[running.pop(future)] = future.result()
+                if progress is not None:
+                    progress(len(run.outputs), len(tasks))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return run
+
+    def _run_task(self, run, task, client, form_data, cache, cancel_event, use_cache=True):
+        prompt = task.prompt(form_data, run.outputs)
+        key = content_hash(f"{type(client).__name__}\0{client.model}\0{prompt}")
+        started = time.perf_counter()
+        output = cache.get(key) if use_cache else None
+        if not output:
+            output = client.generate(prompt, cancel_event=cancel_event)
+            # A cancelled call returns whatever was generated so far, which must not be reused
+            if output and not (cancel_event is not None and cancel_event.is_set()):
+                cache.set(key, output)
+            run.record(task.name, started, time.perf_counter())
+        else:
+            run.record(task.name, started, time.perf_counter(), cached=True)
+        return output
+
+    def sink_prompt(self, run, form_data):
+        """The document prompt, grounded on the outputs the sink depends on"""
+        lines = [build_prompt(form_data), "", AGENTS[self.sink.agent].preamble(), self.sink.instructions]
+        for name in self.sink.depends_on:
+            lines += ["", f"### {name.replace('_', ' ').title()} (from the team)", run.outputs[name]]
+        return "\n".join(lines)
+
+
+SUMMARY_CREW = TaskGraph([
+    Task("research", "researcher", "List the key facts, definitions and common misconceptions about {topic} in {subject}."),
+    Task("objectives", "planner", "Write 3 to 5 learning objectives for a summary of {topic} in {subject}."),
+    Task("outline", "planner", "Outline the sections of a summary on {topic}.", depends_on=("research", "objectives")),
+    Task("examples", "writer", "Write two short worked examples that illustrate {topic}.", depends_on=("research",)),
+    Task("glossary", "writer", "Write a glossary of the key terms of {topic}.", depends_on=("research",)),
+    Task("write", "writer", "Write the final summary following the outline and using the examples and glossary.",
+         depends_on=("outline", "examples", "glossary"))
+])
+
+EXERCISES_CREW = TaskGraph([
+    Task("research", "researcher", "List the key facts, methods and common mistakes for {topic} in {subject}."),
+    Task("objectives", "planner", "Write the learning objectives an exercise list on {topic} should assess."),
+    Task("plan", "planner", "Plan {num_exercises} exercises ({difficulty}) on {topic}: one line per exercise "
+         "giving its type and what it tests.", depends_on=("research", "objectives")),
+    Task("exercises", "assessor", "Write the exercises from the plan, numbered, without solutions.",
+         depends_on=("plan",)),
+    Task("answer_key", "assessor", "Write the answer key for the planned exercises, numbered to match the plan.",
+         depends_on=("plan", "research")),
+    Task("write", "writer", "Assemble the final exercise list: an introduction, the exercises, "
+         "then the answer key section.", depends_on=("exercises", "answer_key"))
+])
+
+DOCUMENT_CREWS = {
+    DocumentType.SUMMARY.value: SUMMARY_CREW,
+    DocumentType.EXERCISES.value: EXERCISES_CREW
+}
+
+
+_crew_cache = None
+_crew_cache_lock = threading.Lock()
+
+
+def get_crew_cache():
+    """Return the process-wide cache of intermediate agent outputs"""
+    global _crew_cache
+    with _crew_cache_lock:
+        if _crew_cache is None:
+            _crew_cache = TieredCache("crew_outputs", max_items=512, ttl=7 * 24 * 3600)
+        return _crew_cache
+
+
+def run_crew_draft_job(job, client, form_data, cache_key=None, use_cache=True):
+    """Job function: run the document's crew graph, then stream the sink task as the draft.
+
+    `use_cache` False regenerates the intermediate task outputs as well as the draft.
+    """
+    graph = DOCUMENT_CREWS[form_data['document_type']]
+    form_data = {'num_exercises': 10, 'difficulty': "Intermediate", **form_data}
+
+    def progress(done, total):
+        job.update(progress=done / (total + 1), message=f"Crew: {done} of {total} preparation tasks done")
+
+    with get_metrics().timer("prompt_build_seconds", document_type=form_data['document_type']):
+        run = graph.run(client, form_data, progress=progress, cancel_event=job.cancel_event, use_cache=use_cache)
+        job.check_cancelled()
+        prompt = graph.sink_prompt(run, form_data)
+
+    started = time.perf_counter()
+    result = run_draft_job(job, client, prompt, cache_key)
+    run.record(graph.sink.name, started, time.perf_counter())
+    result['crew'] = run.as_dict()
+    return result
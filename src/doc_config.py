@@ -1,3 +1,21 @@
+import os
+from enum import Enum
+
+DATA_DIR = os.environ.get("EDUADOCS_DATA_DIR", os.path.join(os.path.expanduser("~"), ".eduadocs"))
+
+class DocumentType(Enum):
+    SUMMARY = "Summary"
+    EXERCISES = "Exercise List"
+    CORRECTION = "Exercise Correction"
+
+class LLMProvider(Enum):
+    OPENAI = "OpenAI"
+    GOOGLE = "Google (Gemini)"
+    HUGGINGFACE = "HuggingFace"
+    OLLAMA = "Ollama"
+
+OUTPUT_LANGUAGES = ['English', 'Português', 'Español', 'Français', '日本語', '普通话', 'Русский', 'हिंदी']
+
 class DocConfig:
     def __init__(self):
         self.config_variables = {
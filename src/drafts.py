@@ -0,0 +1,125 @@
+import threading
+import time
+
+from cache import get_draft_cache
+from doc_config import DocumentType
+
+
+def build_prompt(form_data):
+    """Build the draft prompt for the submitted form"""
+    doc_type = form_data['document_type']
+    lines = [
+        f"{form_data['subject']}: {form_data['topic']}",
+        "",
+        f"Write a {doc_type.lower()} in Markdown for {form_data['audience']} students.",
+        f"Subject: {form_data['subject']}",
+        f"Topic: {form_data['topic']}",
+        f"Write the whole document in {form_data['language']}."
+    ]
+    if doc_type == DocumentType.EXERCISES.value:
+        lines.append(f"Number of exercises: {form_data.get('num_exercises', 10)}")
+        lines.append(f"Difficulty: {form_data.get('difficulty', 'Intermediate')}")
+        if form_data.get('exercise_types'):
+            lines.append(f"Exercise types: {', '.join(form_data['exercise_types'])}")
+        lines.append("Number every exercise and finish with an answer key section.")
+    if form_data.get('details'):
+        lines.append(f"Requirements: {form_data['details']}")
+    if form_data.get('context'):
+        lines.append(f"Additional context: {form_data['context']}")
+    if form_data.get('reference'):
+        lines += ["Outline of an approved document on a similar topic; reuse what fits the request:",
+                  form_data['reference']]
+    lines.append("Use a single top-level heading followed by '##' section headings.")
+    return "\n".join(lines)
+
+
+class GenerationStats:
+    """Timing for one streamed generation. Each streamed chunk counts as one token."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+        self.characters = 0
+        self.cancelled = False
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def total_time(self):
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    @property
+    def tokens_per_second(self):
+        if self.first_token_at is None or self.tokens < 2:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        elapsed = end - self.first_token_at
+        return (self.tokens - 1) / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'time_to_first_token': self.time_to_first_token,
+            'total_time': self.total_time,
+            'tokens': self.tokens,
+            'characters': self.characters,
+            'tokens_per_second': self.tokens_per_second,
+            'cancelled': self.cancelled
+        }
+
+
+class DraftStream:
+    """Iterate over the chunks of a draft while recording generation stats"""
+
+    def __init__(self, client, prompt):
+        self.client = client
+        self.prompt = prompt
+        self.stats = GenerationStats()
+        self._chunks = []
+        self._cancel_event = threading.Event()
+
+    def __iter__(self):
+        try:
+            for chunk in self.client.timed_stream(self.prompt, cancel_event=self._cancel_event):
+                if self.stats.first_token_at is None:
+                    self.stats.first_token_at = time.perf_counter()
+                self.stats.tokens += 1
+                self.stats.characters += len(chunk)
+                self._chunks.append(chunk)
+                yield chunk
+                if self._cancel_event.is_set():
+                    break
+        finally:
+            self.stats.cancelled = self._cancel_event.is_set()
+            self.stats.finished_at = time.perf_counter()
+
+    @property
+    def text(self):
+        return "".join(self._chunks)
+
+    def cancel(self):
+        self._cancel_event.set()
+
+
+def run_draft_job(job, client, prompt, cache_key=None):
+    """Job function: stream a draft, publishing the partial text as it grows"""
+    stream = DraftStream(client, prompt)
+    last_refresh = 0.0
+    for _ in stream:
+        if job.cancelled:
+            stream.cancel()
+        elif stream.stats.total_time - last_refresh >= 0.1:
+            last_refresh = stream.stats.total_time
+            job.update(partial=stream.text,
+                       message=f"{stream.stats.tokens} tokens ({stream.stats.tokens_per_second:.1f} tokens/sec)")
+    job.check_cancelled()
+
+    if cache_key and stream.text:
+        get_draft_cache().set(cache_key, stream.text)
+    return {'text': stream.text, 'stats': stream.stats.as_dict()}
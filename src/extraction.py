@@ -0,0 +1,188 @@
+import io
+import os
+import threading
+import zipfile
+import zlib
+from xml.etree.ElementTree import ParseError, iterparse
+
+from cache import TieredCache, content_hash
+from instrumentation import get_metrics
+
+# Hard ceiling on the text kept for one file; anything beyond it is dropped
+MAX_CHARS = int(os.environ.get("EDUADOCS_EXTRACT_MAX_CHARS", "2000000"))
+# Rough model context budget for one prompt, at ~4 characters per token
+CONTEXT_CHARS = int(os.environ.get("EDUADOCS_CONTEXT_CHARS", "12000"))
+READ_SIZE = 64 * 1024
+TRUNCATED_MARKER = "\n\n[... submission truncated ...]"
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def iter_txt(stream, max_chars=MAX_CHARS):
+    """Yield paragraphs of a text file line by line, with any newline convention.
+
+    A paragraph longer than READ_SIZE is yielded in pieces of about that size, and
+    reading stops once more than `max_chars` have been yielded.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline=None)
+    lines, length, size = [], 0, 0
+    # readline's limit bounds a file without any newline as well
+    for line in iter(lambda: text.readline(READ_SIZE), ""):
+        if line.strip():
+            lines.append(line)
+            length += len(line)
+            if length < READ_SIZE:
+                continue
+        paragraph, carry = "".join(lines), ""
+        if line.strip() and not line.endswith("\n") and " " in paragraph:
+            # Cut inside a line: the last, possibly partial, word starts the next piece
+            paragraph, _, carry = paragraph.rpartition(" ")
+        paragraph = paragraph.strip()
+        lines, length = [carry], len(carry)
+        if paragraph:
+            yield paragraph
+            size += len(paragraph) + 2
+            if size > max_chars:
+                return
+    paragraph = "".join(lines).strip()
+    if paragraph:
+        yield paragraph
+
+
+def iter_pdf(stream):
+    """Yield the text of a PDF one page at a time"""
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PdfReadError
+    except ImportError as e:
+        raise ExtractionError("PDF support requires the 'pypdf' package.") from e
+
+    try:
+        reader = PdfReader(stream)
+        for page in reader.pages:
+            text = page.extract_text() or ""
+            if text.strip():
+                yield text.strip()
+    except PdfReadError as e:
+        raise ExtractionError(f"Could not read PDF: {e}") from e
+    except Exception as e:
+        # Malformed files also surface as assorted errors from pypdf's parser
+        raise ExtractionError(f"Could not read PDF: {type(e).__name__}: {e}") from e
+
+
+def iter_docx(stream):
+    """Yield DOCX paragraphs by streaming word/document.xml out of the archive"""
+    try:
+        archive = zipfile.ZipFile(stream)
+        document = archive.open("word/document.xml")
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise ExtractionError(f"Could not read DOCX: {e}") from e
+
+    with archive, document:
+        try:
+            yield from _docx_paragraphs(document)
+        except (ParseError, zipfile.BadZipFile, zlib.error, EOFError) as e:
+            raise ExtractionError(f"Could not read DOCX: {e}") from e
+
+
+def _docx_paragraphs(document):
+    parts = []
+    for event, element in iterparse(document, events=("end",)):
+        if element.tag == f"{_WORD_NS}t":
+            parts.append(element.text or "")
+        elif element.tag == f"{_WORD_NS}tab":
+            parts.append("\t")
+        elif element.tag == f"{_WORD_NS}p":
+            text = "".join(parts).strip()
+            parts = []
+            element.clear()
+            if text:
+                yield text
+        elif element.tag == f"{_WORD_NS}body":
+            element.clear()
+
+
+EXTRACTORS = {
+    ".txt": iter_txt,
+    ".pdf": iter_pdf,
+    ".docx": iter_docx
+}
+
+
+def iter_text(name, stream):
+    """Yield the text of an uploaded file piece by piece (paragraphs or pages)"""
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in EXTRACTORS:
+        raise ExtractionError(f"Unsupported file type: {extension or name}")
+    return EXTRACTORS[extension](stream)
+
+
+def bounded_text(pieces, max_chars=MAX_CHARS):
+    """Join `pieces` until `max_chars` is reached, stopping the generator there"""
+    kept, size = [], 0
+    for piece in pieces:
+        if size + len(piece) > max_chars:
+            kept.append(piece[:max(0, max_chars - size)])
+            kept.append(TRUNCATED_MARKER)
+            if hasattr(pieces, "close"):
+                pieces.close()
+            break
+        kept.append(piece)
+        size += len(piece) + 2
+    return "\n\n".join(kept)
+
+
+def chunk_text(text, max_chars=CONTEXT_CHARS):
+    """Split `text` on paragraph boundaries into chunks of at most `max_chars`"""
+    chunks, current, size = [], [], 0
+    for paragraph in text.split("\n\n"):
+        while len(paragraph) > max_chars:
+            if current:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            # Cut at the last space or line break, unless that leaves a very short chunk
+            cut = max(paragraph.rfind(" ", 0, max_chars), paragraph.rfind("\n", 0, max_chars))
+            cut = cut if cut > max_chars // 2 else max_chars
+            chunks.append(paragraph[:cut])
+            paragraph = paragraph[cut:].lstrip()
+        if current and size + len(paragraph) + 2 > max_chars:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += len(paragraph) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+_extraction_cache = None
+_extraction_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """Return the process-wide cache of extracted text keyed by file content hash"""
+    global _extraction_cache
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            _extraction_cache = TieredCache("extracted_text", max_items=128, ttl=30 * 24 * 3600)
+        return _extraction_cache
+
+
+def extract_text(name, data):
+    """Return the bounded text of an uploaded file, parsing each distinct file only once"""
+    extension = os.path.splitext(name)[1].lower()
+    key = f"{content_hash(data)}{extension}"
+    cache = get_extraction_cache()
+    metrics = get_metrics()
+    text = cache.get(key)
+    if text is None:
+        with metrics.timer("extraction_seconds", extension=extension):
+            text = bounded_text(iter_text(name, io.BytesIO(data)))
+        cache.set(key, text)
+    else:
+        metrics.incr("extraction_cache_hits_total", extension=extension)
+    return text
@@ -0,0 +1,116 @@
+"""Local stand-in for the Ollama HTTP API, for measuring the client layer offline.
+
+    python src/fake_ollama.py --port 11435 --first-token-latency 0.05
+
+then point the sidebar "Ollama Endpoint" at http://localhost:11435.
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests, like the real server
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # Like the real (Go) server: small streamed chunks must not wait on Nagle's algorithm
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.count_connection()
+        # Stands in for the TCP/TLS handshake cost a remote endpoint would add
+        time.sleep(self.server.handshake_latency)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "fake"}]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.server.first_token_latency)
+        for i in range(self.server.tokens):
+            if i and self.server.token_latency:
+                time.sleep(self.server.token_latency)
+            self._write_chunk({"model": payload.get("model"), "response": f"token{i} ", "done": False})
+        self._write_chunk({"model": payload.get("model"), "response": "", "done": True})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _write_chunk(self, event):
+        data = json.dumps(event).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), first_token_latency=0.05, token_latency=0.0, tokens=50,
+                 handshake_latency=0.0):
+        super().__init__(address, FakeOllamaHandler)
+        self.handshake_latency = handshake_latency
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.tokens = tokens
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def start(self):
+        """Serve from a daemon thread and return self"""
+        threading.Thread(target=self.serve_forever, daemon=True, name="fake-ollama").start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--first-token-latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--handshake-latency", type=float, default=0.0,
+                        help="seconds added to every new connection")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer((args.host, args.port), args.first_token_latency, args.token_latency, args.tokens,
+                              args.handshake_latency)
+    print(f"Fake Ollama listening on {server.endpoint}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
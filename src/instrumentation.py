@@ -0,0 +1,205 @@
+"""Process-wide pipeline metrics: counters and timings with rolling windows.
+
+Every recorded value is appended to a JSON-lines log, and a Prometheus text
+snapshot is rewritten in the background, both under EDUADOCS_METRICS_DIR
+(default: DATA_DIR/metrics). A local scraper can read `metrics.prom` with the
+textfile collector or serve it as is.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from doc_config import DATA_DIR
+
+METRICS_DIR = os.environ.get("EDUADOCS_METRICS_DIR", os.path.join(DATA_DIR, "metrics"))
+# Values kept per timing for the rolling mean and quantiles
+WINDOW = int(os.environ.get("EDUADOCS_METRICS_WINDOW", "200"))
+# Seconds between snapshot rewrites and log flushes
+INTERVAL = float(os.environ.get("EDUADOCS_METRICS_INTERVAL", "5"))
+LOG_MAX_BYTES = int(os.environ.get("EDUADOCS_METRICS_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+PREFIX = "eduadocs_"
+
+HELP = {
+    'form_submissions_total': "Content forms submitted",
+    'prompt_build_seconds': "Time to prepare the draft prompt, including the crew tasks",
+    'llm_time_to_first_token_seconds': "Time from an LLM request to its first token",
+    'llm_call_seconds': "Duration of complete LLM calls",
+    'llm_tokens_total': "Streamed LLM chunks",
+    'llm_errors_total': "Failed LLM calls",
+    'extraction_seconds': "Time to extract text from an uploaded file",
+    'extraction_cache_hits_total': "Uploads whose text came from the extraction cache",
+    'render_seconds': "Time to render a document, memoized renders excluded",
+    'export_seconds': "Duration of export jobs, translation included",
+    'documents_created_total': "Documents rendered for download",
+    'jobs_total': "Background jobs by final status",
+    'job_wait_seconds': "Time background jobs spent queued",
+    'job_run_seconds': "Time background jobs spent running",
+    'import_seconds': "Time to import an optional library on first use",
+    'library_query_seconds': "Time to search the library of approved documents",
+    'library_starts_total': "Drafts started from a library document instead of a generation"
+}
+
+
+class Rolling:
+    """Cumulative count and sum plus a window of the latest values"""
+
+    def __init__(self, window=WINDOW):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.sum += value
+
+    @property
+    def mean(self):
+        return sum(self.values) / len(self.values) if self.values else 0.0
+
+    def quantile(self, q):
+        if not self.values:
+            return 0.0
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Metrics:
+    def __init__(self, directory=METRICS_DIR, interval=INTERVAL, snapshot=True):
+        self.directory = directory
+        self.interval = interval
+        # Only one process may own the snapshot; pool workers just append to the log
+        self.snapshot = snapshot
+        self.log_path = os.path.join(directory, "metrics.jsonl")
+        self.snapshot_path = os.path.join(directory, "metrics.prom")
+        self.counters = {}
+        self.timings = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._writer, daemon=True, name="metrics").start()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def incr(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self._pending.append((time.time(), name, labels, value))
+        self._dirty.set()
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self.timings:
+                self.timings[key] = Rolling()
+            self.timings[key].add(value)
+            self._pending.append((time.time(), name, labels, value))
+        self._dirty.set()
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of the block as `name`, only when it completes"""
+        started = time.perf_counter()
+        yield
+        self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter(self, name, **labels):
+        """Sum of a counter over every label set matching `labels`"""
+        with self._lock:
+            return sum(value for (key, key_labels), value in self.counters.items()
+                       if key == name and set(labels.items()) <= set(key_labels))
+
+    def timing(self, name, **labels):
+        """Merged rolling statistics of a timing over every label set matching `labels`"""
+        merged = Rolling(window=None)
+        with self._lock:
+            for (key, key_labels), rolling in self.timings.items():
+                if key == name and set(labels.items()) <= set(key_labels):
+                    merged.values.extend(rolling.values)
+                    merged.count += rolling.count
+                    merged.sum += rolling.sum
+        return merged
+
+    def prometheus_text(self):
+        with self._lock:
+            counters = sorted(self.counters.items())
+            timings = sorted((key, list(rolling.values), rolling.count, rolling.sum)
+                             for key, rolling in self.timings.items())
+        lines, described = [], set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {PREFIX}{name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+        for (name, labels), values, count, total in timings:
+            describe(name, "summary")
+            rolling = Rolling()
+            rolling.values.extend(values)
+            for q in (0.5, 0.95):
+                lines.append(f"{PREFIX}{name}{_labels(labels + (('quantile', str(q)),))} {rolling.quantile(q):.6f}")
+            lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{PREFIX}{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Append pending values to the log and rewrite the snapshot"""
+        self._dirty.clear()
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > LOG_MAX_BYTES:
+                os.replace(self.log_path, self.log_path + ".1")
+            with open(self.log_path, "a", encoding="utf-8") as log:
+                log.writelines(json.dumps({'ts': ts, 'metric': name, 'labels': labels, 'value': value}) + "\n"
+                               for ts, name, labels, value in pending)
+        if not self.snapshot:
+            return
+        # Write then rename so a scraper never reads a half-written file
+        temporary = self.snapshot_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as snapshot:
+            snapshot.write(self.prometheus_text())
+        os.replace(temporary, self.snapshot_path)
+
+    def _writer(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return the process-wide `Metrics`"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from doc_config import DATA_DIR
+from instrumentation import get_metrics
+from llm import LLMError
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """Handle passed to a running job function for progress reports and cancellation checks"""
+
+    def __init__(self, job_id, kind, meta):
+        self.id = job_id
+        self.kind = kind
+        self.meta = meta
+        self.progress = 0.0
+        self.message = ""
+        self.partial = None
+        self.cancel_event = threading.Event()
+        self.submitted_at = time.time()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def update(self, progress=None, message=None, partial=None):
+        if progress is not None:
+            self.progress = progress
+        if message is not None:
+            self.message = message
+        if partial is not None:
+            self.partial = partial
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Run jobs on a thread pool and persist their status and results in SQLite.
+
+    Job functions are called as `function(job, *args)` and return a str, bytes,
+    binary file object (copied in chunks, then closed) or JSON-serializable
+    value. Results outlive the Streamlit session that submitted them, so a user
+    can come back later with the job id, and finished jobs are deleted with
+    their results once they are older than `ttl`.
+    """
+
+    def __init__(self, path=None, max_workers=None, ttl=None):
+        self.path = path or os.path.join(DATA_DIR, "jobs.sqlite3")
+        self.max_workers = max_workers or int(os.environ.get("EDUADOCS_JOB_WORKERS", "4"))
+        self.ttl = ttl or float(os.environ.get("EDUADOCS_JOB_TTL", str(24 * 3600)))
+        self._submits = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._live = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                meta TEXT NOT NULL,
+                result BLOB,
+                result_kind TEXT,
+                error TEXT,
+                submitted_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        # Jobs left running by a previous process cannot be resumed
+        self._db.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)",
+            (FAILED, "Interrupted by a server restart", time.time(), QUEUED, RUNNING)
+        )
+        self._purge()
+        self._db.commit()
+
+    def submit(self, kind, function, *args, meta=None):
+        """Queue `function(job, *args)` and return the new job id"""
+        job = Job(uuid.uuid4().hex[:12], kind, meta or {})
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, status, meta, submitted_at) VALUES (?, ?, ?, ?, ?)",
+                (job.id, kind, QUEUED, json.dumps(job.meta), job.submitted_at)
+            )
+            self._db.commit()
+            self._live[job.id] = job
+            self._futures[job.id] = self._executor.submit(self._run, job, function, args)
+            self._submits += 1
+            if self._submits % 100 == 0:
+                self._purge()
+                self._db.commit()
+        return job.id
+
+    def purge_expired(self):
+        """Delete jobs that finished more than `ttl` ago and return how many were removed"""
+        with self._lock:
+            removed = self._purge()
+            self._db.commit()
+        return removed
+
+    def _purge(self):
+        return self._db.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished_at <= ?", (*FINISHED, time.time() - self.ttl)
+        ).rowcount
+
+    def _run(self, job, function, args):
+        if job.cancelled:
+            # Cancelled while queued, after the future had already been picked up
+            self._update(job.id, status=CANCELLED, finished_at=time.time())
+            get_metrics().incr("jobs_total", kind=job.kind, status=CANCELLED)
+            with self._lock:
+                self._live.pop(job.id, None)
+                self._futures.pop(job.id, None)
+            return
+        metrics = get_metrics()
+        started_at = time.time()
+        metrics.observe("job_wait_seconds", started_at - job.submitted_at, kind=job.kind)
+        self._update(job.id, status=RUNNING, started_at=started_at)
+        status = FAILED
+        try:
+            result = function(job, *args)
+            job.check_cancelled()
+        except JobCancelled:
+            status = CANCELLED
+            self._update(job.id, status=CANCELLED, finished_at=time.time())
+        except Exception as e:
+            # The error is stored with the job; only unexpected ones are worth a traceback
+            if isinstance(e, LLMError):
+                logger.info("%s job %s failed: %s", job.kind, job.id, e)
+            else:
+                logger.exception("%s job %s failed", job.kind, job.id)
+            self._update(job.id, status=FAILED, error=str(e) or type(e).__name__, finished_at=time.time())
+        else:
+            if hasattr(result, "read"):
+                with result:
+                    self._store_file(job.id, result)
+                self._update(job.id, status=DONE, result_kind="bytes", finished_at=time.time())
+            else:
+                if isinstance(result, bytes):
+                    stored, result_kind = result, "bytes"
+                else:
+                    stored, result_kind = json.dumps(result), "json"
+                self._update(job.id, status=DONE, result=stored, result_kind=result_kind, finished_at=time.time())
+            status = DONE
+        finally:
+            metrics.incr("jobs_total", kind=job.kind, status=status)
+            metrics.observe("job_run_seconds", time.time() - started_at, kind=job.kind)
+            with self._lock:
+                self._live.pop(job.id, None)
+                self._futures.pop(job.id, None)
+
+    def _store_file(self, job_id, result, chunk_size=1024 * 1024):
+        """Copy a file-like result into the job's row in chunks, never holding it all in memory"""
+        if not hasattr(self._db, "blobopen"):
+            # Incremental blob I/O needs Python 3.11
+            self._update(job_id, result=result.read())
+            return
+        size = result.seek(0, os.SEEK_END)
+        result.seek(0)
+        with self._lock:
+            self._db.execute("UPDATE jobs SET result = zeroblob(?) WHERE id = ?", (size, job_id))
+            rowid = self._db.execute("SELECT rowid FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            with self._db.blobopen("jobs", "result", rowid) as blob:
+                while chunk := result.read(chunk_size):
+                    blob.write(chunk)
+            self._db.commit()
+
+    def _update(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def get(self, job_id):
+        """Return the job's status as a dict (without the result), or None if unknown"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, status, meta, error, submitted_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            live = self._live.get(job_id)
+        if row is None:
+            return None
+        status = {
+            'id': row[0], 'kind': row[1], 'status': row[2], 'meta': json.loads(row[3]), 'error': row[4],
+            'submitted_at': row[5], 'started_at': row[6], 'finished_at': row[7],
+            'progress': 1.0 if row[2] == DONE else 0.0, 'message': "", 'partial': None
+        }
+        if live is not None:
+            status.update(progress=live.progress, message=live.message, partial=live.partial)
+        if status['status'] == QUEUED:
+            status['position'] = self.position(job_id, row[5])
+        return status
+
+    def position(self, job_id, submitted_at):
+        """Number of queued jobs ahead of `job_id`"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND submitted_at < ?", (QUEUED, submitted_at)
+            ).fetchone()[0]
+
+    def result(self, job_id):
+        """Return the stored result of a finished job, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result, result_kind FROM jobs WHERE id = ? AND status = ?", (job_id, DONE)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0] if row[1] == "bytes" else json.loads(row[0])
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._live.get(job_id)
+            future = self._futures.get(job_id)
+        if job is None:
+            return False
+        job.cancel_event.set()
+        if future is not None and future.cancel():
+            self._update(job_id, status=CANCELLED, finished_at=time.time())
+            with self._lock:
+                self._live.pop(job_id, None)
+                self._futures.pop(job_id, None)
+        return True
+
+    def metrics(self, window=100):
+        """Queue depth plus average wait and run times over the last `window` finished jobs"""
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            timings = self._db.execute(
+                "SELECT started_at - submitted_at, finished_at - started_at FROM jobs "
+                "WHERE status = ? AND started_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?",
+                (DONE, window)
+            ).fetchall()
+        waits = [wait for wait, _ in timings]
+        runs = [run for _, run in timings]
+        return {
+            'queue_depth': counts.get(QUEUED, 0),
+            'running': counts.get(RUNNING, 0),
+            'done': counts.get(DONE, 0),
+            'failed': counts.get(FAILED, 0),
+            'cancelled': counts.get(CANCELLED, 0),
+            'avg_wait': sum(waits) / len(waits) if waits else 0.0,
+            'max_wait': max(waits) if waits else 0.0,
+            'avg_run': sum(runs) / len(runs) if runs else 0.0
+        }
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue shared by all Streamlit sessions"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
@@ -0,0 +1,238 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+
+from cache import content_hash
+from doc_config import DATA_DIR
+from instrumentation import get_metrics
+from sections import split_sections
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Subject and topic words count this many times in a document's term frequencies
+TITLE_WEIGHT = 3
+# Score factor for documents written for another audience
+AUDIENCE_MISMATCH = 0.8
+# Share of the topic's words a document must contain to be offered
+MIN_TOPIC_COVERAGE = 0.5
+MAX_QUERY_TERMS = 32
+GROUNDING_CHARACTERS = 1200
+
+_WORD = re.compile(r"\w+")
+_SENTENCE = re.compile(r"(?<=[.!?])\s")
+STOPWORDS = frozenset("""
+    a about after all also an and any are as at be because been but by can could do does each for from had has
+    have how if in into is it its may more most must no not of on or other our should so some such than that the
+    their them then there these they this those to under up use used using was we were what when where which
+    while who will with would you your
+""".split())
+
+
+def terms(text):
+    """Lower-cased words of `text` without stopwords and single characters"""
+    return [word for word in _WORD.findall(text.casefold()) if len(word) > 1 and word not in STOPWORDS]
+
+
+def grounding(content, max_characters=GROUNDING_CHARACTERS):
+    """A compact outline of `content`: each heading with the first sentence under it"""
+    lines, size = [], 0
+    for section in split_sections(content, max_level=3):
+        body = " ".join(line.strip() for line in section.body.splitlines() if line.strip())
+        first = _SENTENCE.split(body, 1)[0][:200] if body else ""
+        line = f"{'#' * section.level} {section.title}".strip() + (f"\n{first}" if first else "")
+        if size + len(line) > max_characters:
+            break
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+class Match:
+    """An approved document returned by a library search"""
+
+    def __init__(self, id, score, topic_coverage, subject, topic, audience, words):
+        self.id = id
+        self.score = score
+        self.topic_coverage = topic_coverage
+        self.subject = subject
+        self.topic = topic
+        self.audience = audience
+        self.words = words
+
+    @property
+    def title(self):
+        return f"{self.subject}: {self.topic}"
+
+    def as_dict(self):
+        return {'id': self.id, 'score': self.score, 'topic_coverage': self.topic_coverage, 'title': self.title,
+                'audience': self.audience, 'words': self.words}
+
+
+class DocumentLibrary:
+    """Approved documents in SQLite with a BM25 inverted index over their text.
+
+    Postings are clustered by term, so a query reads only the posting lists of its
+    own terms, and scoring runs inside SQLite. Adding a document updates the
+    postings, document frequencies and corpus totals in one transaction; nothing
+    is ever rebuilt. Searches match the same document type and language.
+    """
+
+    def __init__(self, path=None, level=6):
+        self.path = path or os.path.join(DATA_DIR, "library.sqlite3")
+        self.level = level
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Approvals commit one at a time; in WAL mode this still survives a crash of the app
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                document_type TEXT NOT NULL,
+                language TEXT NOT NULL,
+                audience TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                words INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                content BLOB NOT NULL,
+                form_data TEXT NOT NULL,
+                added_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                document_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, document_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS corpus (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                documents INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO corpus VALUES (0, 0, 0);
+        """)
+        self._db.commit()
+
+    def add(self, form_data, content):
+        """Index an approved document; return its id. Adding the same document again changes nothing."""
+        return self.add_many([(form_data, content)])[0]
+
+    def add_many(self, documents):
+        """Index (form_data, content) pairs in one transaction; return their ids"""
+        ids = []
+        with self._lock, self._db:
+            for form_data, content in documents:
+                ids.append(self._add(form_data, content))
+        return ids
+
+    def _add(self, form_data, content):
+        fields = {name: form_data.get(name) or "" for name in
+                  ('document_type', 'language', 'audience', 'subject', 'topic', 'details')}
+        key = content_hash(json.dumps(fields, sort_keys=True, ensure_ascii=False) + "\0" + content)
+        frequencies = Counter(terms(content))
+        for term in terms(f"{fields['subject']} {fields['topic']}"):
+            frequencies[term] += TITLE_WEIGHT
+        length = sum(frequencies.values())
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO documents (key, document_type, language, audience, subject, topic, words, "
+            "length, content, form_data, added_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, fields['document_type'], fields['language'], fields['audience'], fields['subject'],
+             fields['topic'], len(content.split()), length, zlib.compress(content.encode("utf-8"), self.level),
+             json.dumps(fields, ensure_ascii=False), time.time())
+        )
+        if not cursor.rowcount:
+            return self._db.execute("SELECT id FROM documents WHERE key = ?", (key,)).fetchone()[0]
+        document_id = cursor.lastrowid
+        self._db.executemany("INSERT INTO postings VALUES (?, ?, ?)",
+                             [(term, document_id, tf) for term, tf in frequencies.items()])
+        self._db.executemany("INSERT INTO terms VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                             [(term,) for term in frequencies])
+        self._db.execute("UPDATE corpus SET documents = documents + 1, length = length + ? WHERE id = 0", (length,))
+        return document_id
+
+    def search(self, form_data, limit=3, min_topic_coverage=MIN_TOPIC_COVERAGE):
+        """Return the best `Match`es for a content form by subject, topic and details, best first"""
+        weights = {}
+        for field, weight in (('details', 0.5), ('subject', 1.0), ('topic', 1.0)):
+            for term in terms(form_data.get(field) or "")[:MAX_QUERY_TERMS]:
+                weights[term] = weight
+        topic_terms = set(terms(form_data.get('topic') or ""))
+        if not topic_terms:
+            return []
+
+        with get_metrics().timer("library_query_seconds"), self._lock:
+            documents, total_length = self._db.execute("SELECT documents, length FROM corpus").fetchone()
+            if not documents:
+                return []
+            placeholders = ", ".join("?" * len(weights))
+            frequencies = dict(self._db.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders})",
+                                                list(weights)))
+            query = [(term, weights[term] * math.log(1 + (documents - df + 0.5) / (df + 0.5)), term in topic_terms)
+                     for term, df in frequencies.items()]
+            if not query:
+                return []
+            # Only documents holding enough of the topic's words are scored, which keeps the long
+            # posting lists of subject and detail words from being read in full
+            rows = self._db.execute(f"""
+                WITH query (term, weight, topic) AS (VALUES {", ".join(["(?, ?, ?)"] * len(query))}),
+                candidates (id, hits) AS (
+                    SELECT p.document_id, COUNT(*) FROM query q JOIN postings p ON p.term = q.term
+                    WHERE q.topic GROUP BY p.document_id HAVING COUNT(*) >= ?
+                )
+                SELECT d.id, SUM(q.weight * p.tf * {K1 + 1} / (p.tf + {K1} * (1 - {B} + {B} * d.length / ?)))
+                           * (CASE WHEN d.audience = ? THEN 1.0 ELSE {AUDIENCE_MISMATCH} END) AS score,
+                       c.hits, d.subject, d.topic, d.audience, d.words
+                FROM candidates c
+                CROSS JOIN documents d ON d.id = c.id
+                CROSS JOIN query q
+                CROSS JOIN postings p ON p.term = q.term AND p.document_id = c.id
+                WHERE d.document_type = ? AND d.language = ?
+                GROUP BY d.id
+                ORDER BY score DESC
+                LIMIT ?
+            """, [value for row in query for value in row] + [
+                min_topic_coverage * len(topic_terms), total_length / documents, form_data.get('audience') or "",
+                form_data.get('document_type') or "", form_data.get('language') or "", limit
+            ]).fetchall()
+        return [Match(id, score, hits / len(topic_terms), subject, topic, audience, words)
+                for id, score, hits, subject, topic, audience, words in rows]
+
+    def get(self, document_id):
+        """Return the Markdown of a library document, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT content FROM documents WHERE id = ?", (document_id,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def stats(self):
+        with self._lock:
+            documents, length = self._db.execute("SELECT documents, length FROM corpus").fetchone()
+            vocabulary = self._db.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+        return {'documents': documents, 'terms': vocabulary, 'average_length': length / documents if documents else 0.0}
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_library():
+    """Return the process-wide library of approved documents"""
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = DocumentLibrary()
+        return _library
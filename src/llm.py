@@ -0,0 +1,491 @@
+import hashlib
+import http.client
+import json
+import os
+import ssl
+import threading
+import time
+import urllib.parse
+
+from doc_config import LLMProvider
+from instrumentation import get_metrics
+
+
+class LLMError(Exception):
+    """Raised when a provider call fails. `retryable` marks transient failures."""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(f"HTTP {status}: {detail}")
+        self.status = status
+        self.detail = detail
+
+
+_ssl_context = None
+_ssl_context_lock = threading.Lock()
+
+
+def get_ssl_context():
+    """Building a context loads the CA bundle, so do it once per process"""
+    global _ssl_context
+    with _ssl_context_lock:
+        if _ssl_context is None:
+            _ssl_context = ssl.create_default_context()
+        return _ssl_context
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one host.
+
+    At most `max_connections` requests run at once; up to `max_idle` finished
+    connections are kept for reuse until they sit idle for `idle_timeout` seconds.
+    """
+
+    def __init__(self, scheme, host, port, max_connections=10, max_idle=4, idle_timeout=60.0, timeout=120):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.created = 0
+        self.reused = 0
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self.created += 1
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=get_ssl_context())
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        self._slots.acquire()
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                connection, last_used = self._idle.pop()
+                if now - last_used < self.idle_timeout:
+                    self.reused += 1
+                    return connection, True
+                connection.close()
+        return self._connect(), False
+
+    def _release(self, connection, reusable):
+        with self._lock:
+            if reusable and len(self._idle) < self.max_idle:
+                self._idle.append((connection, time.monotonic()))
+                connection = None
+        if connection is not None:
+            connection.close()
+        self._slots.release()
+
+    def _send(self, method, path, body, headers):
+        connection, reused = self._acquire()
+        try:
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                return connection, connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if not reused:
+                    raise
+            # The server closed the kept-alive connection meanwhile; retry once on a fresh one
+            connection.close()
+            connection = self._connect()
+            connection.request(method, path, body=body, headers=headers)
+            return connection, connection.getresponse()
+        except BaseException:
+            self._release(connection, False)
+            raise
+
+    def request_lines(self, method, path, body=None, headers=None, cancel_event=None):
+        """Yield the raw lines of the response body, raising `HTTPStatusError` for HTTP errors.
+
+        A connection goes back to the pool only when its body was read completely.
+        """
+        connection, response = self._send(method, path, body, headers or {})
+        reusable = False
+        try:
+            if response.status >= 400:
+                detail = response.read().decode("utf-8", errors="replace")[:500]
+                reusable = not response.will_close
+                raise HTTPStatusError(response.status, detail)
+            for raw_line in response:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                yield raw_line
+            reusable = not response.will_close
+        finally:
+            self._release(connection, reusable)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            connection.close()
+
+
+class LLMClient:
+    """Base class for streaming LLM clients"""
+
+    provider = None
+
+    def __init__(self, model, timeout=120, registry=None):
+        self.model = model
+        self.timeout = timeout
+        self.registry = registry
+
+    def stream(self, prompt, cancel_event=None):
+        """Yield text chunks as the provider produces them"""
+        raise NotImplementedError
+
+    def timed_stream(self, prompt, cancel_event=None):
+        """`stream`, recording the time to first token, call duration, chunk count and failures"""
+        metrics = get_metrics()
+        provider = self.provider.value if self.provider else "Fake"
+        started = time.perf_counter()
+        chunks = 0
+        try:
+            for chunk in self.stream(prompt, cancel_event=cancel_event):
+                if not chunks:
+                    metrics.observe("llm_time_to_first_token_seconds", time.perf_counter() - started,
+                                    provider=provider)
+                chunks += 1
+                yield chunk
+        except LLMError:
+            metrics.incr("llm_errors_total", provider=provider)
+            raise
+        finally:
+            metrics.incr("llm_tokens_total", chunks, provider=provider)
+        metrics.observe("llm_call_seconds", time.perf_counter() - started, provider=provider)
+
+    def generate(self, prompt, cancel_event=None):
+        """Return the full completion for `prompt`"""
+        return "".join(self.timed_stream(prompt, cancel_event=cancel_event))
+
+    async def astream(self, prompt):
+        """Async version of `stream`: the blocking call runs on a worker thread"""
+        # Only async callers pay for importing asyncio
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancel_event = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for chunk in self.timed_stream(prompt, cancel_event=cancel_event):
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancel_event.set()
+            await producer
+
+    async def agenerate(self, prompt):
+        """Async version of `generate`"""
+        return "".join([chunk async for chunk in self.astream(prompt)])
+
+    def _post_lines(self, url, payload, headers=None, cancel_event=None):
+        """POST `payload` as JSON over a pooled connection and yield the non-empty response lines"""
+        registry = self.registry or get_registry()
+        pool = registry.pool(url, self.timeout)
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        try:
+            for raw_line in pool.request_lines("POST", path, body, headers, cancel_event):
+                line = raw_line.decode("utf-8").strip()
+                if line:
+                    yield line
+        except HTTPStatusError as e:
+            raise LLMError(f"{self.provider.value} returned HTTP {e.status}: {e.detail}",
+                           retryable=e.status == 429 or e.status >= 500) from e
+        except (http.client.HTTPException, UnicodeDecodeError) as e:
+            raise LLMError(f"Bad response from {self.provider.value}: {e}", retryable=True) from e
+        except OSError as e:
+            raise LLMError(f"Could not reach {self.provider.value}: {e}", retryable=True) from e
+
+    def _sse_events(self, url, payload, headers=None, cancel_event=None):
+        """Yield decoded JSON events from a server-sent-events response"""
+        finished = False
+        for line in self._post_lines(url, payload, headers, cancel_event):
+            # Keep reading past [DONE] so the connection can go back to the pool
+            if finished or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                finished = True
+                continue
+            yield self._decode(data)
+
+    def _decode(self, data):
+        """Parse one JSON line of a streamed response; a malformed line is a transient provider error"""
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError as e:
+            raise LLMError(f"Bad response from {self.provider.value}: {e}", retryable=True) from e
+
+
+class OpenAIClient(LLMClient):
+    provider = LLMProvider.OPENAI
+    url = "https://api.openai.com/v1/chat/completions"
+
+    def __init__(self, api_key, model="gpt-4", timeout=120, registry=None):
+        super().__init__(model, timeout, registry)
+        self.api_key = api_key
+
+    def stream(self, prompt, cancel_event=None):
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        for event in self._sse_events(self.url, payload, headers, cancel_event):
+            for choice in event.get("choices", []):
+                text = choice.get("delta", {}).get("content")
+                if text:
+                    yield text
+
+
+class GoogleClient(LLMClient):
+    provider = LLMProvider.GOOGLE
+    url = "https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent"
+
+    def __init__(self, api_key, model="gemini-pro", timeout=120, registry=None):
+        super().__init__(model, timeout, registry)
+        self.api_key = api_key
+
+    def stream(self, prompt, cancel_event=None):
+        url = self.url.format(model=self.model) + "?" + urllib.parse.urlencode({"alt": "sse", "key": self.api_key})
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        for event in self._sse_events(url, payload, cancel_event=cancel_event):
+            for candidate in event.get("candidates", []):
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+
+
+class HuggingFaceClient(LLMClient):
+    provider = LLMProvider.HUGGINGFACE
+    url = "https://api-inference.huggingface.co/models/{model}"
+
+    def __init__(self, api_key, model="microsoft/DialoGPT-medium", max_new_tokens=2048, timeout=120, registry=None):
+        super().__init__(model, timeout, registry)
+        self.api_key = api_key
+        self.max_new_tokens = max_new_tokens
+
+    def stream(self, prompt, cancel_event=None):
+        payload = {
+            "inputs": prompt,
+            "parameters": {"max_new_tokens": self.max_new_tokens, "return_full_text": False},
+            "stream": True
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        for event in self._sse_events(self.url.format(model=self.model), payload, headers, cancel_event):
+            token = event.get("token", {})
+            if token.get("text") and not token.get("special"):
+                yield token["text"]
+
+
+class OllamaClient(LLMClient):
+    provider = LLMProvider.OLLAMA
+
+    def __init__(self, endpoint="http://localhost:11434", model="llama2", timeout=300, registry=None):
+        super().__init__(model, timeout, registry)
+        self.endpoint = endpoint.rstrip("/")
+
+    def stream(self, prompt, cancel_event=None):
+        payload = {"model": self.model, "prompt": prompt, "stream": True}
+        for line in self._post_lines(f"{self.endpoint}/api/generate", payload, cancel_event=cancel_event):
+            event = self._decode(line)
+            if event.get("error"):
+                raise LLMError(f"Ollama error: {event['error']}")
+            if event.get("response"):
+                yield event["response"]
+
+
+class FakeClient(LLMClient):
+    """Deterministic offline client with configurable latency and output size"""
+
+    provider = None
+
+    def __init__(self, model="fake", first_token_latency=0.2, token_latency=0.01, output_tokens=400):
+        super().__init__(model)
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.output_tokens = output_tokens
+
+    def stream(self, prompt, cancel_event=None):
+        time.sleep(self.first_token_latency)
+        for i, token in enumerate(self._tokens(prompt)):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            yield token
+
+    def _tokens(self, prompt):
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        title = prompt.strip().splitlines()[0][:80] if prompt.strip() else "Draft"
+        words = ["students", "learn", "the", "concept", "through", "examples", "and",
+                 "practice", "which", "builds", "understanding", "of", "key", "ideas"]
+        rewrite = prompt.partition("\nSection to rewrite:\n")[2]
+        if rewrite:
+            # Section rewrites come back about as long as the section
+            heading, _, body = rewrite.partition("\n")
+            yield heading + "\n\n"
+            for i in range(max(len(body.split()), 40)):
+                yield words[i % len(words)] + (".\n\n" if i % 40 == 39 else " ")
+            yield f"Revised {seed[:8]}.\n"
+            return
+        yield f"# {title}\n\n"
+        emitted, section = 1, 0
+        while emitted < self.output_tokens:
+            if emitted % 120 == 1:
+                section += 1
+                yield f"\n## Section {section} ({seed[section % 64]})\n\nPart {seed[:8]}-{section}: "
+            else:
+                word = words[(emitted + section) % len(words)]
+                yield word + (".\n\n" if emitted % 40 == 0 else " ")
+            emitted += 1
+
+
+def fake_client_from_env():
+    """Build a `FakeClient` when EDUADOCS_FAKE_LLM is set, otherwise return None"""
+    if not os.environ.get("EDUADOCS_FAKE_LLM"):
+        return None
+    return FakeClient(
+        first_token_latency=float(os.environ.get("EDUADOCS_FAKE_TTFT", "0.2")),
+        token_latency=float(os.environ.get("EDUADOCS_FAKE_TOKEN_LATENCY", "0.01")),
+        output_tokens=int(os.environ.get("EDUADOCS_FAKE_TOKENS", "400"))
+    )
+
+
+# Sidebar keys for each provider: (API key setting, model setting, default model)
+PROVIDER_SETTINGS = {
+    LLMProvider.OPENAI: ("openai_key", "openai_model", "gpt-4"),
+    LLMProvider.GOOGLE: ("google_key", "google_model", "gemini-pro"),
+    LLMProvider.HUGGINGFACE: ("hf_key", "hf_model", "microsoft/DialoGPT-medium"),
+    LLMProvider.OLLAMA: (None, "ollama_model", "llama2")
+}
+
+CLIENT_CLASSES = {
+    LLMProvider.OPENAI: OpenAIClient,
+    LLMProvider.GOOGLE: GoogleClient,
+    LLMProvider.HUGGINGFACE: HuggingFaceClient,
+    LLMProvider.OLLAMA: OllamaClient
+}
+
+
+def credential_hash(secret):
+    """Fingerprint a credential so cache keys never hold the secret itself"""
+    return hashlib.sha256((secret or "").encode("utf-8")).hexdigest()[:16]
+
+
+class ClientRegistry:
+    """Process-wide cache of provider clients and of their per-host connection pools.
+
+    Clients are keyed by (provider, endpoint, credential hash, model) and reused
+    across Streamlit reruns and sessions; clients for the same host share one
+    keep-alive pool.
+    """
+
+    def __init__(self, max_connections=None, max_idle=None, idle_timeout=None):
+        self.max_connections = max_connections or int(os.environ.get("EDUADOCS_POOL_MAX_CONNECTIONS", "10"))
+        self.max_idle = max_idle or int(os.environ.get("EDUADOCS_POOL_MAX_IDLE", "4"))
+        self.idle_timeout = idle_timeout or float(os.environ.get("EDUADOCS_POOL_IDLE_TIMEOUT", "60"))
+        self._clients = {}
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def pool(self, url, timeout=120):
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, parts.hostname, port)
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = ConnectionPool(parts.scheme, parts.hostname, port, self.max_connections,
+                                                  self.max_idle, self.idle_timeout, timeout)
+            return self._pools[key]
+
+    def get(self, provider, settings):
+        """Return the cached client for `provider` and the sidebar settings, building it once"""
+        provider = LLMProvider(provider)
+        key_setting, model_setting, default_model = PROVIDER_SETTINGS[provider]
+        secret = settings.get(key_setting) if key_setting else None
+        model = settings.get(model_setting) or default_model
+        if provider == LLMProvider.OLLAMA:
+            endpoint = settings.get("ollama_endpoint") or "http://localhost:11434"
+        else:
+            endpoint = CLIENT_CLASSES[provider].url
+            if not secret:
+                raise LLMError(f"Please provide the {provider.value} API key in the sidebar.")
+
+        key = (provider, endpoint, credential_hash(secret), model)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                first_argument = endpoint if provider == LLMProvider.OLLAMA else secret
+                client = CLIENT_CLASSES[provider](first_argument, model, registry=self)
+                self._clients[key] = client
+            return client
+
+    def stats(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            clients = len(self._clients)
+        return {
+            'clients': clients,
+            'pools': len(pools),
+            'connections_created': sum(pool.created for pool in pools),
+            'connections_reused': sum(pool.reused for pool in pools)
+        }
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide client registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry()
+        return _registry
+
+
+def get_client(provider, settings):
+    """Return the pooled client for `provider` configured from the sidebar settings mapping"""
+    fake = fake_client_from_env()
+    if fake is not None:
+        return fake
+    return get_registry().get(provider, settings)
@@ -0,0 +1,116 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from corrections import generate_with_retry
+from llm import LLMError
+from sections import join_sections, restore_heading, split_sections
+
+# Sections shorter than this (in words) are flagged as weak
+MIN_SECTION_WORDS = 40
+# Characters of each neighbouring section sent as context
+NEIGHBOUR_CHARS = 400
+
+_PLACEHOLDER = re.compile(r"\b(TODO|TBD|FIXME|lorem ipsum)\b|\[(insert|add|placeholder)[^\]]*\]|\.\.\.\s*$",
+                          re.IGNORECASE | re.MULTILINE)
+_SENTENCE = re.compile(r"[^.!?]+[.!?]")
+
+
+def weak_sections(sections):
+    """Return {index: reason} for sections that look empty, thin, unfinished or repetitive"""
+    weak = {}
+    for index, section in enumerate(sections):
+        body = section.body.strip()
+        has_subsections = index + 1 < len(sections) and sections[index + 1].level > section.level > 0
+        last_line = body.splitlines()[-1].strip() if body else ""
+        sentences = [sentence.strip().lower() for sentence in _SENTENCE.findall(body)]
+        if not body and section.heading is not None and not has_subsections:
+            weak[index] = "empty"
+        elif _PLACEHOLDER.search(body):
+            weak[index] = "placeholder text"
+        elif last_line[:1].isalpha() and last_line[-1] not in ".!?:;)*_`\"'":
+            weak[index] = "ends mid-sentence"
+        elif body and len(body.split()) < MIN_SECTION_WORDS and section.level >= 2 and not has_subsections:
+            weak[index] = f"only {len(body.split())} words"
+        elif len(sentences) >= 4 and len(set(sentences)) < len(sentences) * 0.75:
+            weak[index] = "repeats itself"
+    return weak
+
+
+def build_section_prompt(form_data, sections, index, instructions=""):
+    """Prompt for rewriting one section, with the outline and the edges of its neighbours as context"""
+    section = sections[index]
+    outline = "\n".join(f"{'  ' * max(other.level - 1, 0)}- {other.title}" for other in sections)
+    lines = [
+        f"{form_data['subject']}: {form_data['topic']}",
+        "",
+        f"Rewrite one section of a {form_data['document_type'].lower()} for {form_data['audience']} students, "
+        f"in {form_data['language']}.",
+        "Keep its heading line exactly as it is and reply with the rewritten section only, in Markdown.",
+        "Do not repeat what the neighbouring sections already cover."
+    ]
+    if instructions:
+        lines.append(f"Instructions: {instructions}")
+    lines += ["", "Document outline:", outline]
+    if index > 0:
+        lines += ["", "End of the previous section:", sections[index - 1].text[-NEIGHBOUR_CHARS:]]
+    if index + 1 < len(sections):
+        lines += ["", "Start of the next section:", sections[index + 1].text[:NEIGHBOUR_CHARS]]
+    lines += ["", "Section to rewrite:", section.text]
+    return "\n".join(lines)
+
+
+class SectionRegenerator:
+    """Regenerate selected sections of a draft concurrently and splice them back in"""
+
+    def __init__(self, client, form_data, max_workers=None, max_retries=3, backoff=1.0, rate_limiter=None):
+        self.client = client
+        self.form_data = form_data
+        self.max_workers = max_workers or int(os.environ.get("EDUADOCS_SECTION_WORKERS", "4"))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = rate_limiter
+
+    def _regenerate(self, sections, index, instructions):
+        prompt = build_section_prompt(self.form_data, sections, index, instructions)
+        reply, _, error = generate_with_retry(self.client, prompt, self.max_retries, self.backoff, self.rate_limiter)
+        if error is not None:
+            raise LLMError(f"Could not regenerate \"{sections[index].title}\": {error}")
+        text = restore_heading(sections[index].text, reply.strip())
+        return text, len(prompt)
+
+    def regenerate(self, content, indices, instructions="", progress=None):
+        """Return (new content, stats). `progress` is called with the spliced text as sections finish."""
+        started = time.perf_counter()
+        sections = split_sections(content)
+        texts = [section.text for section in sections]
+        indices = sorted(index for index in set(indices) if 0 <= index < len(sections))
+        prompt_characters = 0
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="section")
+        try:
+            futures = {executor.submit(self._regenerate, sections, index, instructions): index for index in indices}
+            for done, future in enumerate(as_completed(futures), start=1):
+                texts[futures[future]], characters = future.result()
+                prompt_characters += characters
+                if progress is not None:
+                    progress(done, len(indices), join_sections(texts))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return join_sections(texts), {
+            'sections': len(sections),
+            'regenerated': len(indices),
+            'prompt_characters': prompt_characters,
+            'document_characters': len(content),
+            'total_time': time.perf_counter() - started
+        }
+
+
+def run_section_job(job, regenerator, content, indices, instructions=""):
+    """Job function: regenerate `indices` of `content`, publishing the spliced draft as sections finish"""
+    def progress(done, total, text):
+        job.update(progress=done / total, partial=text, message=f"Regenerated {done} of {total} sections")
+        job.check_cancelled()
+
+    text, stats = regenerator.regenerate(content, indices, instructions, progress)
+    return {'text': text, 'stats': stats}
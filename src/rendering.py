@@ -0,0 +1,970 @@
+import html
+import io
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from functools import lru_cache
+
+from cache import content_hash
+from instrumentation import get_metrics
+
+OUTPUT_FORMATS = {
+    "DOCX (Word Document)": ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    "PDF": ("pdf", "application/pdf"),
+    "HTML": ("html", "text/html"),
+    "PPTX (Slides)": ("pptx", "application/vnd.openxmlformats-officedocument.presentationml.presentation")
+}
+
+STYLES = {
+    "Academic": {
+        'font': "Times New Roman", 'heading_font': "Times New Roman", 'pdf_font': "Times",
+        'heading_color': "#000000", 'accent_color': "#444444", 'line_spacing': 1.5, 'margin_in': 1.0
+    },
+    "Professional": {
+        'font': "Calibri", 'heading_font': "Calibri Light", 'pdf_font': "Helvetica",
+        'heading_color': "#1F3864", 'accent_color': "#2E75B6", 'line_spacing': 1.15, 'margin_in': 1.0
+    },
+    "Casual": {
+        'font': "Verdana", 'heading_font': "Trebuchet MS", 'pdf_font': "Helvetica",
+        'heading_color': "#C0504D", 'accent_color': "#F79646", 'line_spacing': 1.3, 'margin_in': 0.8
+    },
+    "Custom": {
+        'font': "Georgia", 'heading_font': "Georgia", 'pdf_font': "Times",
+        'heading_color': "#375623", 'accent_color': "#70AD47", 'line_spacing': 1.2, 'margin_in': 1.0
+    }
+}
+
+HEADING_SCALE = {1: 2.0, 2: 1.5, 3: 1.25, 4: 1.1, 5: 1.0, 6: 1.0}
+LINK_COLOR = "#0563C1"
+# Unicode TrueType fonts for PDFs by the style's built-in font, which only covers Latin-1.
+# The first regular face found is used, with its bold and italic files when they exist.
+_SANS_FONT_PATHS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf"
+]
+PDF_FONT_PATHS = {
+    'Helvetica': [os.environ.get("EDUADOCS_PDF_FONT", "")] + _SANS_FONT_PATHS,
+    'Times': [
+        os.environ.get("EDUADOCS_PDF_FONT", ""),
+        "/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf",
+        "/usr/share/fonts/dejavu/DejaVuSerif.ttf",
+        "C:\\Windows\\Fonts\\times.ttf"
+    ] + _SANS_FONT_PATHS,
+    'Courier': [
+        "/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf",
+        "/usr/share/fonts/dejavu/DejaVuSansMono.ttf",
+        "C:\\Windows\\Fonts\\cour.ttf"
+    ]
+}
+# File name suffixes of the bold, italic and bold italic faces (DejaVu, then Windows naming)
+PDF_FONT_VARIANTS = {
+    "B": ("-Bold", "bd"),
+    "I": ("-Oblique", "-Italic", "i"),
+    "BI": ("-BoldOblique", "-BoldItalic", "bi")
+}
+# Extra fonts tried for glyphs the main PDF font lacks (CJK, Devanagari)
+PDF_FALLBACK_FONT_PATHS = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/noto/NotoSansDevanagari-Regular.ttf"
+]
+RENDER_CACHE_ITEMS = int(os.environ.get("EDUADOCS_RENDER_CACHE_ITEMS", "64"))
+RENDER_CACHE_BYTES = int(float(os.environ.get("EDUADOCS_RENDER_CACHE_MB", "32")) * 1024 * 1024)
+# Rendered files larger than this are spooled to a temporary file on disk
+SPOOL_MAX_BYTES = int(os.environ.get("EDUADOCS_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+# Slide overflow limits: a section continues on a new slide past either of them
+SLIDE_MAX_BULLETS = 7
+SLIDE_MAX_CHARACTERS = 550
+# Longer paragraphs are cut at sentence ends into bullets of about this size
+BULLET_MAX_CHARACTERS = 220
+
+
+class RenderOptions:
+    """Hashable document options taken from the approved-content page"""
+
+    def __init__(self, output_format="DOCX (Word Document)", template_style="Academic", font_size="12pt",
+                 include_header=True, include_footer=True, title="", subtitle=""):
+        self.output_format = output_format
+        self.template_style = template_style if template_style in STYLES else "Academic"
+        self.font_size = font_size
+        self.include_header = include_header
+        self.include_footer = include_footer
+        self.title = title
+        self.subtitle = subtitle
+
+    @property
+    def extension(self):
+        return OUTPUT_FORMATS[self.output_format][0]
+
+    @property
+    def mime(self):
+        return OUTPUT_FORMATS[self.output_format][1]
+
+    @property
+    def points(self):
+        return float(self.font_size.rstrip("pt"))
+
+    def key(self):
+        return (self.output_format, self.template_style, self.font_size, self.include_header,
+                self.include_footer, self.title, self.subtitle)
+
+
+# --- Markdown parsing -------------------------------------------------------
+
+class Span:
+    __slots__ = ("text", "bold", "italic", "code", "link")
+
+    def __init__(self, text, bold=False, italic=False, code=False, link=None):
+        self.text = text
+        self.bold = bold
+        self.italic = italic
+        self.code = code
+        self.link = link
+
+
+class Block:
+    """One node of the document tree: heading, paragraph, item, quote, code, table or rule"""
+
+    __slots__ = ("kind", "spans", "level", "ordered", "text", "rows")
+
+    def __init__(self, kind, spans=None, level=0, ordered=False, text="", rows=None):
+        self.kind = kind
+        self.spans = spans or []
+        self.level = level
+        self.ordered = ordered
+        self.text = text
+        self.rows = rows or []
+
+
+# The emphasis bodies are lazy so that "*x* and *y*" closes at the first marker
+_INLINE = re.compile(
+    r"\*\*(?P<b1>.+?)\*\*|__(?P<b2>.+?)__"
+    r"|\*(?P<i1>[^\s*](?:.*?[^\s*])??)\*|(?<!\w)_(?P<i2>[^\s_](?:.*?[^\s_])??)_(?!\w)"
+    r"|`(?P<code>[^`]+)`|\[(?P<link>[^\]]+)\]\((?P<url>[^)\s]*)(?:\s+\"[^\"]*\")?\)"
+)
+# Link targets kept in rendered documents; anything else (e.g. javascript:) is dropped
+_SAFE_LINK = re.compile(r"^(https?://|mailto:|#)", re.IGNORECASE)
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_ITEM = re.compile(r"^(\s*)([-*+]|\d+[.)])\s+(.*)$")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?$")
+
+
+def parse_inline(text, bold=False, italic=False):
+    spans, position = [], 0
+    for match in _INLINE.finditer(text):
+        if match.start() > position:
+            spans.append(Span(text[position:match.start()], bold, italic))
+        if match.group("b1") or match.group("b2"):
+            spans.extend(parse_inline(match.group("b1") or match.group("b2"), True, italic))
+        elif match.group("i1") or match.group("i2"):
+            spans.extend(parse_inline(match.group("i1") or match.group("i2"), bold, True))
+        elif match.group("code"):
+            spans.append(Span(match.group("code"), bold, italic, code=True))
+        else:
+            link = match.group("url") if _SAFE_LINK.match(match.group("url")) else None
+            for span in parse_inline(match.group("link"), bold, italic):
+                span.link = link
+                spans.append(span)
+        position = match.end()
+    if position < len(text):
+        spans.append(Span(text[position:], bold, italic))
+    return spans
+
+
+def _split_row(line):
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def parse_markdown(text):
+    """Parse Markdown into a flat list of `Block` nodes"""
+    blocks, paragraph, code, table = [], [], None, None
+
+    def flush_paragraph():
+        if paragraph:
+            blocks.append(Block("paragraph", parse_inline(" ".join(paragraph))))
+            paragraph.clear()
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if code is not None:
+            if stripped.startswith("```"):
+                blocks.append(Block("code", text="\n".join(code)))
+                code = None
+            else:
+                code.append(line)
+            continue
+        if table is not None:
+            if stripped.startswith("|"):
+                if not _TABLE_SEPARATOR.match(stripped):
+                    table.append([parse_inline(cell) for cell in _split_row(stripped)])
+                continue
+            blocks.append(Block("table", rows=table))
+            table = None
+
+        if stripped.startswith("```"):
+            flush_paragraph()
+            code = []
+        elif not stripped:
+            flush_paragraph()
+        elif stripped.startswith("|") and stripped.endswith("|"):
+            flush_paragraph()
+            table = [[parse_inline(cell) for cell in _split_row(stripped)]]
+        elif _RULE.match(line):
+            flush_paragraph()
+            blocks.append(Block("rule"))
+        elif _HEADING.match(stripped):
+            flush_paragraph()
+            marks, title = _HEADING.match(stripped).groups()
+            blocks.append(Block("heading", parse_inline(title), level=len(marks)))
+        elif _ITEM.match(line):
+            flush_paragraph()
+            indent, marker, item = _ITEM.match(line).groups()
+            blocks.append(Block("item", parse_inline(item), level=len(indent.expandtabs(4)) // 2,
+                                ordered=marker[0].isdigit()))
+        elif stripped.startswith(">"):
+            flush_paragraph()
+            blocks.append(Block("quote", parse_inline(stripped.lstrip(">").strip())))
+        else:
+            paragraph.append(stripped)
+
+    flush_paragraph()
+    if code is not None:
+        blocks.append(Block("code", text="\n".join(code)))
+    if table is not None:
+        blocks.append(Block("table", rows=table))
+    return blocks
+
+
+class _Memo:
+    """Thread-safe LRU of values built on demand.
+
+    With `max_bytes`, values are bytes and their total size is capped as well;
+    a value larger than the cap is returned but not kept.
+    """
+
+    def __init__(self, max_items, max_bytes=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        value = self.peek(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def peek(self, key):
+        """Return the value for `key` without building it, or None"""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        return None
+
+    def put(self, key, value):
+        if self.max_bytes is not None and len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            self._items[key] = value
+            self.size += len(value) if self.max_bytes is not None else 0
+            while len(self._items) > self.max_items or (self.max_bytes is not None and self.size > self.max_bytes):
+                self._drop(next(iter(self._items)))
+
+    def _drop(self, key):
+        value = self._items.pop(key)
+        self.size -= len(value) if self.max_bytes is not None else 0
+
+
+_parsed = _Memo(32)
+
+
+def parse_document(text, digest=None):
+    """Parse `text` once per distinct content hash"""
+    digest = digest or content_hash(text)
+    return _parsed.get(digest, lambda: tuple(parse_markdown(text)))
+
+
+def plain_text(spans):
+    return "".join(span.text for span in spans)
+
+
+# --- Precompiled style templates ---------------------------------------------
+
+@lru_cache(maxsize=None)
+def compile_css(template_style, font_size):
+    style = STYLES[template_style]
+    size = float(font_size.rstrip("pt"))
+    headings = "\n".join(
+        f"h{level} {{ font-size: {size * scale:.1f}pt; }}" for level, scale in HEADING_SCALE.items()
+    )
+    return f"""
+@page {{ margin: {style['margin_in']}in; @bottom-center {{ content: counter(page); }} }}
+body {{ font-family: '{style['font']}', serif; font-size: {size}pt; line-height: {style['line_spacing']};
+        max-width: 48em; margin: 2em auto; padding: 0 1em; color: #222; }}
+h1, h2, h3, h4, h5, h6 {{ font-family: '{style['heading_font']}', sans-serif; color: {style['heading_color']}; }}
+{headings}
+blockquote {{ border-left: 4px solid {style['accent_color']}; margin-left: 0; padding-left: 1em; color: #555; }}
+pre, code {{ font-family: 'Courier New', monospace; background: #f5f5f5; }}
+pre {{ padding: 0.75em; overflow-x: auto; }}
+table {{ border-collapse: collapse; }}
+th, td {{ border: 1px solid #bbb; padding: 0.3em 0.6em; }}
+header.doc-header {{ border-bottom: 2px solid {style['accent_color']}; margin-bottom: 1.5em; }}
+header.doc-header p {{ color: {style['accent_color']}; margin: 0.2em 0; }}
+footer.doc-footer {{ border-top: 1px solid #ccc; margin-top: 2em; font-size: 0.85em; color: #777; }}
+""".strip()
+
+
+@lru_cache(maxsize=None)
+def compile_docx_template(template_style, font_size):
+    """Build the styled empty DOCX once per (style, size) and return its bytes"""
+    from docx import Document
+    from docx.enum.text import WD_LINE_SPACING
+    from docx.shared import Inches, Pt, RGBColor
+
+    style = STYLES[template_style]
+    size = float(font_size.rstrip("pt"))
+    document = Document()
+    for section in document.sections:
+        section.left_margin = section.right_margin = Inches(style['margin_in'])
+        section.top_margin = section.bottom_margin = Inches(style['margin_in'])
+
+    normal = document.styles["Normal"]
+    normal.font.name = style['font']
+    normal.font.size = Pt(size)
+    normal.paragraph_format.line_spacing_rule = WD_LINE_SPACING.MULTIPLE
+    normal.paragraph_format.line_spacing = style['line_spacing']
+
+    color = RGBColor.from_string(style['heading_color'].lstrip("#"))
+    for level, scale in HEADING_SCALE.items():
+        heading = document.styles[f"Heading {level}"]
+        heading.font.name = style['heading_font']
+        heading.font.size = Pt(size * scale)
+        heading.font.color.rgb = color
+    document.styles["Title"].font.name = style['heading_font']
+    document.styles["Title"].font.color.rgb = color
+
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def find_pdf_font(pdf_font):
+    """Return {"" | "B" | "I" | "BI": path} of the TrueType faces standing in for `pdf_font`, or {}"""
+    regular = next((path for path in PDF_FONT_PATHS[pdf_font] if path and os.path.exists(path)), None)
+    if regular is None:
+        return {}
+    stem, extension = os.path.splitext(regular)
+    faces = {"": regular}
+    for variant, suffixes in PDF_FONT_VARIANTS.items():
+        # A missing face falls back to the regular one rather than failing the render
+        faces[variant] = next((stem + suffix + extension for suffix in suffixes
+                               if os.path.exists(stem + suffix + extension)), regular)
+    return faces
+
+
+@lru_cache(maxsize=1)
+def find_pdf_fallback_fonts():
+    """Return the fallback font paths available on this machine"""
+    return [path for path in PDF_FALLBACK_FONT_PATHS if os.path.exists(path)]
+
+
+# --- Renderers ---------------------------------------------------------------
+
+def _html_spans(spans):
+    parts = []
+    for span in spans:
+        text = html.escape(span.text)
+        if span.code:
+            text = f"<code>{text}</code>"
+        if span.italic:
+            text = f"<em>{text}</em>"
+        if span.bold:
+            text = f"<strong>{text}</strong>"
+        if span.link:
+            text = f'<a href="{html.escape(span.link)}">{text}</a>'
+        parts.append(text)
+    return "".join(parts)
+
+
+def render_html_body(blocks):
+    """Render the document tree to an HTML fragment"""
+    out, lists = [], []
+
+    def close_lists(level):
+        while len(lists) - 1 > level:
+            out.append(f"</li></{lists.pop()}>")
+
+    for block in blocks:
+        if block.kind == "item":
+            tag = "ol" if block.ordered else "ul"
+            close_lists(block.level)
+            if len(lists) - 1 == block.level and lists[-1] != tag:
+                close_lists(block.level - 1)
+            if len(lists) - 1 < block.level:
+                out.append(f"<{tag}><li>")
+                lists.append(tag)
+            else:
+                out.append("</li><li>")
+            out.append(_html_spans(block.spans))
+            continue
+        close_lists(-1)
+        if block.kind == "heading":
+            out.append(f"<h{block.level}>{_html_spans(block.spans)}</h{block.level}>")
+        elif block.kind == "paragraph":
+            out.append(f"<p>{_html_spans(block.spans)}</p>")
+        elif block.kind == "quote":
+            out.append(f"<blockquote>{_html_spans(block.spans)}</blockquote>")
+        elif block.kind == "code":
+            out.append(f"<pre><code>{html.escape(block.text)}</code></pre>")
+        elif block.kind == "rule":
+            out.append("<hr>")
+        elif block.kind == "table":
+            rows = [f"<tr>{''.join(f'<th>{_html_spans(cell)}</th>' for cell in block.rows[0])}</tr>"]
+            rows += [f"<tr>{''.join(f'<td>{_html_spans(cell)}</td>' for cell in row)}</tr>"
+                     for row in block.rows[1:]]
+            out.append(f"<table>{''.join(rows)}</table>")
+    close_lists(-1)
+    return "\n".join(out)
+
+
+def render_html(blocks, options):
+    header = ""
+    if options.include_header:
+        header = (f'<header class="doc-header"><p><strong>{html.escape(options.title)}</strong></p>'
+                  f'<p>{html.escape(options.subtitle)}</p></header>')
+    footer = '<footer class="doc-footer">Generated with EduADocs</footer>' if options.include_footer else ""
+    document = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(options.title or "EduADocs")}</title>
+<style>
+{compile_css(options.template_style, options.font_size)}
+</style>
+</head>
+<body>
+{header}
+{render_html_body(blocks)}
+{footer}
+</body>
+</html>
+"""
+    return document.encode("utf-8")
+
+
+def _docx_runs(paragraph, spans):
+    for span in spans:
+        run = paragraph.add_run(span.text)
+        if span.link:
+            _docx_hyperlink(paragraph, run, span.link)
+        if span.bold:
+            run.bold = True
+        if span.italic:
+            run.italic = True
+        if span.code:
+            run.font.name = "Courier New"
+
+
+def _docx_hyperlink(paragraph, run, url):
+    """Move `run` into a hyperlink to `url`, styled as a link"""
+    from docx.opc.constants import RELATIONSHIP_TYPE
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+    from docx.shared import RGBColor
+
+    hyperlink = OxmlElement("w:hyperlink")
+    hyperlink.set(qn("r:id"), paragraph.part.relate_to(url, RELATIONSHIP_TYPE.HYPERLINK, is_external=True))
+    run._r.addprevious(hyperlink)
+    hyperlink.append(run._r)
+    run.font.underline = True
+    run.font.color.rgb = RGBColor.from_string(LINK_COLOR.lstrip("#"))
+
+
+def _docx_page_number(paragraph):
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    run = paragraph.add_run()
+    for kind, text in (("begin", None), (None, "PAGE"), ("end", None)):
+        if kind:
+            element = OxmlElement("w:fldChar")
+            element.set(qn("w:fldCharType"), kind)
+        else:
+            element = OxmlElement("w:instrText")
+            element.set(qn("xml:space"), "preserve")
+            element.text = text
+        run._r.append(element)
+
+
+def render_docx(blocks, options):
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Inches
+
+    document = Document(io.BytesIO(compile_docx_template(options.template_style, options.font_size)))
+    section = document.sections[0]
+    if options.include_header:
+        header = section.header.paragraphs[0]
+        header.text = options.title
+        if options.subtitle:
+            section.header.add_paragraph(options.subtitle)
+    if options.include_footer:
+        footer = section.footer.paragraphs[0]
+        footer.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        footer.add_run("Page ")
+        _docx_page_number(footer)
+
+    # Resolving a style by name scans the whole style table, so look each id up once
+    style_ids = {}
+
+    def add_paragraph(style):
+        if style not in style_ids:
+            style_ids[style] = document.styles[style].style_id
+        paragraph = document.add_paragraph()
+        paragraph._p.style = style_ids[style]
+        return paragraph
+
+    for block in blocks:
+        if block.kind == "heading":
+            _docx_runs(add_paragraph(f"Heading {block.level}"), block.spans)
+        elif block.kind == "paragraph":
+            _docx_runs(document.add_paragraph(), block.spans)
+        elif block.kind == "item":
+            style = "List Number" if block.ordered else "List Bullet"
+            if block.level:
+                style += f" {min(block.level + 1, 3)}"
+            _docx_runs(add_paragraph(style), block.spans)
+        elif block.kind == "quote":
+            _docx_runs(add_paragraph("Quote"), block.spans)
+        elif block.kind == "code":
+            paragraph = document.add_paragraph()
+            paragraph.paragraph_format.left_indent = Inches(0.3)
+            run = paragraph.add_run(block.text)
+            run.font.name = "Courier New"
+        elif block.kind == "rule":
+            document.add_paragraph("─" * 40).alignment = WD_ALIGN_PARAGRAPH.CENTER
+        elif block.kind == "table":
+            columns = max(len(row) for row in block.rows)
+            table = document.add_table(rows=len(block.rows), cols=columns)
+            if "Table Grid" not in style_ids:
+                style_ids["Table Grid"] = document.styles["Table Grid"].style_id
+            table._tbl.tblStyle_val = style_ids["Table Grid"]
+            for row, cells in zip(table.rows, block.rows):
+                for cell, spans in zip(row.cells, cells):
+                    _docx_runs(cell.paragraphs[0], spans)
+
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def render_pdf(blocks, options):
+    from fpdf import FPDF
+
+    style = STYLES[options.template_style]
+    size = options.points
+    faces = find_pdf_font(style['pdf_font'])
+    mono_faces = find_pdf_font("Courier")
+
+    class DocumentPDF(FPDF):
+        def header(self):
+            if options.include_header:
+                self.set_font(family, "I", size * 0.8)
+                self.cell(0, size * 0.5, text(options.title + (f" | {options.subtitle}" if options.subtitle else "")))
+                self.ln(size)
+
+        def footer(self):
+            if options.include_footer:
+                self.set_y(-15)
+                self.set_font(family, "I", size * 0.8)
+                self.cell(0, 10, f"Page {self.page_no()}/{{nb}}", align="C")
+
+    pdf = DocumentPDF(unit="mm", format="A4")
+    margin = style['margin_in'] * 25.4
+    pdf.set_margins(margin, margin, margin)
+    pdf.set_auto_page_break(True, margin=margin)
+    if faces:
+        family = "DocFont"
+        for variant, path in faces.items():
+            pdf.add_font(family, variant, path)
+        if mono_faces:
+            mono_family = "DocMono"
+            for variant, path in mono_faces.items():
+                pdf.add_font(mono_family, variant, path)
+        else:
+            mono_family = family
+        fallbacks = []
+        for index, path in enumerate(find_pdf_fallback_fonts()):
+            pdf.add_font(f"Fallback{index}", "", path)
+            fallbacks.append(f"Fallback{index}")
+        if fallbacks:
+            pdf.set_fallback_fonts(fallbacks, exact_match=False)
+
+        def text(value):
+            return value
+    else:
+        family, mono_family = style['pdf_font'], "Courier"
+
+        def text(value):
+            return value.encode("latin-1", "replace").decode("latin-1")
+
+    line_height = size * 0.3528 * style['line_spacing']
+    heading_color = tuple(int(style['heading_color'][i:i + 2], 16) for i in (1, 3, 5))
+    link_color = tuple(int(LINK_COLOR[i:i + 2], 16) for i in (1, 3, 5))
+    pdf.add_page()
+
+    def write_spans(spans, scale=1.0, base_style=""):
+        for span in spans:
+            font_style = base_style + ("B" if span.bold and "B" not in base_style else "") + \
+                ("I" if span.italic and "I" not in base_style else "")
+            if span.link:
+                with pdf.local_context(text_color=link_color):
+                    pdf.set_font(mono_family if span.code else family, font_style + "U", size * scale)
+                    pdf.write(line_height * scale, text(span.text), link=span.link)
+                continue
+            pdf.set_font(mono_family if span.code else family, font_style, size * scale)
+            pdf.write(line_height * scale, text(span.text))
+        pdf.ln(line_height * scale)
+
+    numbers = {}
+    for block in blocks:
+        if block.kind != "item":
+            numbers.clear()
+        if block.kind == "heading":
+            scale = HEADING_SCALE[block.level]
+            pdf.ln(line_height * 0.5)
+            pdf.set_text_color(*heading_color)
+            write_spans(block.spans, scale, "B")
+            pdf.set_text_color(0, 0, 0)
+        elif block.kind == "paragraph":
+            write_spans(block.spans)
+            pdf.ln(line_height * 0.4)
+        elif block.kind == "item":
+            for level in [level for level in numbers if level > block.level]:
+                del numbers[level]
+            ordered, count = numbers.get(block.level, (block.ordered, 0))
+            count = count + 1 if ordered == block.ordered else 1
+            numbers[block.level] = (block.ordered, count)
+            pdf.set_x(margin + 6 * (block.level + 1))
+            bullet = f"{count}. " if block.ordered else ("• " if faces else "- ")
+            pdf.set_font(family, "", size)
+            pdf.write(line_height, bullet)
+            write_spans(block.spans)
+        elif block.kind == "quote":
+            pdf.set_text_color(90, 90, 90)
+            write_spans(block.spans, base_style="I")
+            pdf.set_text_color(0, 0, 0)
+        elif block.kind == "code":
+            pdf.set_font(mono_family, "", size * 0.9)
+            pdf.multi_cell(0, line_height, text(block.text), fill=False)
+            pdf.ln(line_height * 0.4)
+        elif block.kind == "rule":
+            y = pdf.get_y() + line_height / 2
+            pdf.line(margin, y, pdf.w - margin, y)
+            pdf.ln(line_height)
+        elif block.kind == "table":
+            for row in block.rows:
+                write_spans([Span(" | ".join(plain_text(cell) for cell in row))])
+            pdf.ln(line_height * 0.4)
+
+    return bytes(pdf.output())
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _bullet_chunks(text):
+    """Cut `text` at sentence ends into pieces of at most about BULLET_MAX_CHARACTERS"""
+    chunks, current = [], ""
+    for sentence in _SENTENCE_END.split(text):
+        if current and len(current) + len(sentence) > BULLET_MAX_CHARACTERS:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class _SlideWriter:
+    """Adds slides one at a time, continuing a section on a new slide when the current one is full.
+
+    python-pptx keeps every slide of a deck in memory and scans them all to add
+    another, so `presentation` only ever holds the slide being filled. Each finished
+    slide is written into the zip `archive` and dropped from the deck.
+    """
+
+    def __init__(self, presentation, options, archive):
+        from pptx.dml.color import RGBColor
+        from pptx.util import Pt
+
+        self.presentation = presentation
+        self.options = options
+        self.archive = archive
+        self.slide = None
+        self.style = STYLES[options.template_style]
+        self.heading_color = RGBColor.from_string(self.style['heading_color'].lstrip("#"))
+        self.body_size = Pt(options.points * 1.5)
+        self.small_size = Pt(options.points * 0.9)
+        self.count = 0
+        self.title = None
+        self.body = None
+        self.bullets = 0
+        self.characters = 0
+
+    def _add(self, layout, title):
+        self.flush()
+        slide = self.slide = self.presentation.slides.add_slide(self.presentation.slide_layouts[layout])
+        slide.shapes.title.text = title
+        for run in slide.shapes.title.text_frame.paragraphs[0].runs:
+            run.font.name = self.style['heading_font']
+            run.font.color.rgb = self.heading_color
+        self.count += 1
+        self._decorate(slide)
+        return slide
+
+    def flush(self):
+        """Write the current slide and its relationships into the archive, then drop it from the deck"""
+        if self.slide is None:
+            return
+        # The slide's layout and hyperlink targets are relative to ppt/slides/, whatever its number
+        self.archive.writestr(f"ppt/slides/slide{self.count}.xml", self.slide.part.blob)
+        self.archive.writestr(f"ppt/slides/_rels/slide{self.count}.xml.rels", self.slide.part.rels.xml)
+        slide_ids = self.presentation.slides._sldIdLst
+        for slide_id in list(slide_ids):
+            slide_ids.remove(slide_id)
+            self.presentation.part.drop_rel(slide_id.rId)
+        self.slide = self.body = None
+
+    def finish(self):
+        """Flush the last slide and write the deck's other parts, listing every written slide"""
+        from pptx.opc.constants import CONTENT_TYPE, RELATIONSHIP_TYPE
+
+        self.flush()
+        part = self.presentation.part
+        first = 1 + max(int(rId[3:]) for rId in part.rels.keys() if rId[3:].isdigit())
+        slide_ids = self.presentation.slides._sldIdLst
+        for number in range(1, self.count + 1):
+            slide_ids._add_sldId(id=255 + number, rId=f"rId{first + number - 1}")
+        relationships = "".join(
+            f'<Relationship Id="rId{first + number - 1}" Type="{RELATIONSHIP_TYPE.SLIDE}" '
+            f'Target="slides/slide{number}.xml"/>' for number in range(1, self.count + 1)
+        ).encode()
+        overrides = "".join(
+            f'<Override PartName="/ppt/slides/slide{number}.xml" ContentType="{CONTENT_TYPE.PML_SLIDE}"/>'
+            for number in range(1, self.count + 1)
+        ).encode()
+        skeleton = io.BytesIO()
+        self.presentation.save(skeleton)
+        with zipfile.ZipFile(skeleton) as package:
+            for item in package.infolist():
+                data = package.read(item)
+                if item.filename == "ppt/_rels/presentation.xml.rels":
+                    data = data.replace(b"</Relationships>", relationships + b"</Relationships>")
+                elif item.filename == "[Content_Types].xml":
+                    data = data.replace(b"</Types>", overrides + b"</Types>")
+                self.archive.writestr(item, data)
+
+    def _decorate(self, slide):
+        from pptx.util import Inches
+
+        width, height = self.presentation.slide_width, self.presentation.slide_height
+        notes = []
+        if self.options.include_header and self.options.title:
+            notes.append((Inches(0.4), self.options.title))
+        if self.options.include_footer:
+            notes.append((width - Inches(1.4), str(self.count)))
+        for left, text in notes:
+            frame = slide.shapes.add_textbox(left, height - Inches(0.5), Inches(6), Inches(0.35)).text_frame
+            frame.text = text
+            frame.paragraphs[0].runs[0].font.size = self.small_size
+
+    def title_slide(self, title, subtitle=""):
+        slide = self._add(0, title)
+        slide.placeholders[1].text = subtitle
+        self.title = title
+        self.body = None
+
+    def section_slide(self, title):
+        self._add(2, title)
+        self.title = title
+        self.body = None
+
+    def content_slide(self, title):
+        from pptx.enum.text import MSO_AUTO_SIZE
+
+        self.title = title
+        slide = self._add(1, title)
+        self.body = slide.placeholders[1].text_frame
+        # Let PowerPoint shrink text that still overflows, e.g. a long unbroken line
+        self.body.auto_size = MSO_AUTO_SIZE.TEXT_TO_FIT_SHAPE
+        self.bullets = 0
+        self.characters = 0
+
+    def bullet(self, spans, level=0, bold=False, font=None):
+        text = plain_text(spans)
+        if self.body is None:
+            self.content_slide(self.title or self.options.title or "Overview")
+        elif self.bullets >= SLIDE_MAX_BULLETS or self.characters + len(text) > SLIDE_MAX_CHARACTERS:
+            self.content_slide(self.title if self.title.endswith("(cont.)") else f"{self.title} (cont.)")
+        paragraph = self.body.paragraphs[0] if not self.bullets else self.body.add_paragraph()
+        paragraph.level = min(level, 4)
+        for span in spans:
+            run = paragraph.add_run()
+            run.text = span.text
+            run.font.name = font or ("Courier New" if span.code else self.style['font'])
+            run.font.size = self.body_size
+            run.font.bold = bold or span.bold
+            run.font.italic = span.italic
+            if span.link:
+                run.hyperlink.address = span.link
+        self.bullets += 1
+        self.characters += len(text)
+
+    def text(self, spans, level=0, **kwargs):
+        """Add `spans` as one or more bullets, long text cut at sentence ends"""
+        chunks = _bullet_chunks(plain_text(spans))
+        if len(chunks) <= 1:
+            self.bullet(spans, level, **kwargs)
+        else:
+            for chunk in chunks:
+                self.bullet([Span(chunk)], level, **kwargs)
+
+
+def render_pptx(blocks, options, output):
+    """Write a slide deck into `output`: one slide per section, overflowing onto continuation slides"""
+    from pptx import Presentation
+
+    archive = zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED)
+    writer = _SlideWriter(Presentation(), options, archive)
+    if options.title:
+        writer.title_slide(options.title, options.subtitle)
+    for block in blocks:
+        if block.kind == "heading" and block.level == 1:
+            title = plain_text(block.spans)
+            if writer.count == 0:
+                writer.title_slide(title, options.subtitle)
+            elif title != options.title:
+                writer.section_slide(title)
+        elif block.kind == "heading" and block.level == 2:
+            writer.content_slide(plain_text(block.spans))
+        elif block.kind == "heading":
+            writer.bullet(block.spans, bold=True)
+        elif block.kind == "paragraph":
+            writer.text(block.spans)
+        elif block.kind == "item":
+            writer.text(block.spans, level=block.level)
+        elif block.kind == "quote":
+            writer.text([Span(span.text, span.bold, True, span.code) for span in block.spans])
+        elif block.kind == "code":
+            for line in block.text.splitlines():
+                writer.bullet([Span(line)], level=1, font="Courier New")
+        elif block.kind == "table":
+            for row in block.rows:
+                writer.bullet([Span(" | ".join(plain_text(cell) for cell in row))], level=1)
+    with archive:
+        writer.finish()
+
+
+RENDERERS = {
+    "html": render_html,
+    "docx": render_docx,
+    "pdf": render_pdf
+}
+# Renderers writing into a file object, for outputs too large to keep as memoized bytes
+FILE_RENDERERS = {
+    "pptx": render_pptx
+}
+
+_rendered = _Memo(RENDER_CACHE_ITEMS, RENDER_CACHE_BYTES)
+
+
+def render_document_file(content, options):
+    """Render Markdown `content` into a file object positioned at its start.
+
+    File renderers write into a spooled temporary file that moves to disk past
+    SPOOL_MAX_BYTES. Outputs up to that size are memoized like the other formats,
+    within RENDER_CACHE_BYTES; larger ones are rendered again each time.
+    """
+    if options.extension not in FILE_RENDERERS:
+        return io.BytesIO(render_document(content, options))
+    digest = content_hash(content)
+    key = (digest, options.key())
+    data = _rendered.peek(key)
+    if data is not None:
+        return io.BytesIO(data)
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    with get_metrics().timer("render_seconds", format=options.extension):
+        FILE_RENDERERS[options.extension](parse_document(content, digest), options, output)
+    size = output.tell()
+    output.seek(0)
+    if size > SPOOL_MAX_BYTES:
+        return output
+    with output:
+        data = output.read()
+    _rendered.put(key, data)
+    return io.BytesIO(data)
+
+
+def render_document(content, options):
+    """Render Markdown `content` to bytes, memoized per (content hash, options)"""
+    if options.extension in FILE_RENDERERS:
+        with render_document_file(content, options) as output:
+            return output.read()
+
+    def build():
+        with get_metrics().timer("render_seconds", format=options.extension):
+            return RENDERERS[options.extension](parse_document(content, digest), options)
+
+    digest = content_hash(content)
+    return _rendered.get((digest, options.key()), build)
+
+
+# --- On-page previews --------------------------------------------------------
+
+_previews = _Memo(32)
+_stats = _Memo(256)
+
+
+def preview_html(content):
+    """HTML fragment previewing `content` on the page, memoized per content hash"""
+    digest = content_hash(content)
+    return _previews.get(digest, lambda: render_html_body(parse_document(content, digest)))
+
+
+def content_stats(content):
+    """Word, character and section counts of `content`, memoized per content hash"""
+    def build():
+        words = len(content.split())
+        return {
+            'words': words,
+            'characters': len(content),
+            'sections': sum(1 for block in parse_document(content, digest) if block.kind == "heading"),
+            'reading_minutes': words / 200
+        }
+
+    digest = content_hash(content)
+    return _stats.get(digest, build)
+
+
+def run_export_job(job, content, options):
+    """Job function: render the approved content for download"""
+    job.update(message=f"Rendering {options.extension.upper()}")
+    metrics = get_metrics()
+    with metrics.timer("export_seconds", kind="export"):
+        output = render_document_file(content, options)
+    metrics.incr("documents_created_total", format=options.extension)
+    return output
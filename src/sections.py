@@ -0,0 +1,60 @@
+import re
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+
+class Section:
+    """A heading and the Markdown under it. The preamble before the first heading has no heading."""
+
+    def __init__(self, heading, level, lines):
+        self.heading = heading
+        self.level = level
+        self.lines = lines
+
+    @property
+    def text(self):
+        return "\n".join(self.lines)
+
+    @property
+    def body(self):
+        return "\n".join(self.lines[1:] if self.heading is not None else self.lines)
+
+    @property
+    def title(self):
+        return self.heading or "(Introduction)"
+
+
+def split_sections(markdown, max_level=6):
+    """Split Markdown at headings up to `max_level`, ignoring '#' lines inside code fences"""
+    sections = [Section(None, 0, [])]
+    in_code = False
+    for line in markdown.splitlines():
+        if line.strip().startswith("```"):
+            in_code = not in_code
+        match = None if in_code else _HEADING.match(line.strip())
+        if match and len(match.group(1)) <= max_level:
+            sections.append(Section(match.group(2), len(match.group(1)), [line]))
+        else:
+            sections[-1].lines.append(line)
+    if not sections[0].lines or not sections[0].text.strip():
+        sections.pop(0)
+    return sections
+
+
+def join_sections(texts):
+    """Join section texts back into one Markdown document, one blank line between sections"""
+    return "\n\n".join(text.strip("\n") for text in texts if text.strip()) + "\n"
+
+
+def restore_heading(original, rewritten):
+    """Keep the original heading marker if the model changed it, or the whole heading line if it dropped it"""
+    original_first = original.lstrip().split("\n", 1)[0]
+    if not original_first.startswith("#"):
+        return rewritten
+    marker = original_first.split(" ", 1)[0]
+    first, _, rest = rewritten.lstrip().partition("\n")
+    if not _HEADING.match(first.strip()):
+        return f"{original_first}\n{rewritten.lstrip()}"
+    if first.split(" ", 1)[0] == marker:
+        return rewritten
+    return f"{marker} {first.lstrip('#').strip()}" + (f"\n{rest}" if rest else "")
@@ -0,0 +1,234 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cache import content_hash, get_draft_cache
+from corrections import generate_with_retry
+from doc_config import DocumentType
+from llm import LLMError
+from sections import split_sections
+
+# Largest number of exercises asked of the model in one call
+SHARD_SIZE = int(os.environ.get("EDUADOCS_SHARD_SIZE", "10"))
+
+# "Exercise 3:", "Question 3", "Ex. 3 -" or "3." at the start of a heading, not a number in the question.
+# A bare number takes only ".", ")" or ":" so that "5 - 3 = ?" stays intact.
+_NUMBER_LABEL = re.compile(r"^[\W_]*(?:(?:exercise|question|problem|ex\.?)\s*\d+\s*[:.)\-–]?|\d+\s*[:.)])(?=\s|\*|$)"
+                           r"[\s*]*", re.IGNORECASE)
+_ANSWER_LABEL = re.compile(r"^\s*\*\*[^*\n]{1,30}:\s*\*\*")
+
+
+class Shard:
+    """`count` exercises of one type, generated by one model call"""
+
+    def __init__(self, index, exercise_type, count, part=1, parts=1):
+        self.index = index
+        self.exercise_type = exercise_type
+        self.count = count
+        self.part = part
+        self.parts = parts
+
+
+def should_shard(form_data, shard_size=SHARD_SIZE):
+    return (form_data['document_type'] == DocumentType.EXERCISES.value
+            and form_data.get('num_exercises', 10) > shard_size)
+
+
+def plan_shards(form_data, num_exercises=None, shard_size=SHARD_SIZE):
+    """Spread the exercises evenly over the selected types, then cut each type into shards"""
+    total = num_exercises or form_data.get('num_exercises', 10)
+    types = form_data.get('exercise_types') or ["Mixed"]
+    shards = []
+    for position, exercise_type in enumerate(types):
+        count = total // len(types) + (1 if position < total % len(types) else 0)
+        parts = -(-count // shard_size)
+        for part in range(1, parts + 1):
+            size = min(shard_size, count - (part - 1) * shard_size)
+            shards.append(Shard(len(shards), exercise_type, size, part, parts))
+    return shards
+
+
+def build_shard_prompt(form_data, shard, avoid=()):
+    lines = [
+        f"{form_data['subject']}: {form_data['topic']}",
+        "",
+        f"Write exactly {shard.count} {shard.exercise_type.lower()} exercises on {form_data['topic']} "
+        f"({form_data['subject']}) for {form_data['audience']} students.",
+        f"Difficulty: {form_data.get('difficulty', 'Intermediate')}.",
+        f"Write in {form_data['language']} using Markdown.",
+        "Start every exercise with a '### ' heading and do not number the exercises.",
+        "Put the solution of each exercise on its own line, right after it, starting with '**Answer:**'.",
+        "Reply with the exercises only, no introduction."
+    ]
+    if shard.parts > 1:
+        lines.append(f"This is set {shard.part} of {shard.parts} of the {shard.exercise_type.lower()} exercises: "
+                     "cover a different part of the topic than the other sets.")
+    if form_data.get('details'):
+        lines.append(f"Requirements: {form_data['details']}")
+    if form_data.get('context'):
+        lines.append(f"Additional context: {form_data['context']}")
+    if form_data.get('reference'):
+        lines += ["Outline of an approved exercise list on a similar topic; reuse what fits the request:",
+                  form_data['reference']]
+    if avoid:
+        lines += ["", "Do not repeat any of these existing exercises:"]
+        lines += [f"- {question}" for question in avoid]
+    return "\n".join(lines)
+
+
+class Exercise:
+    def __init__(self, title, question, answer, exercise_type):
+        self.title = title
+        self.question = question
+        self.answer = answer
+        self.exercise_type = exercise_type
+
+    @property
+    def key(self):
+        """Hash of the normalized question (or title), used to drop duplicates across shards"""
+        text = (self.question or self.title).lower()
+        return content_hash(" ".join(re.findall(r"\w+", text)))
+
+    @property
+    def summary(self):
+        first = next((line.strip() for line in self.question.splitlines() if line.strip()), self.title)
+        return first[:120]
+
+
+def parse_exercises(text, exercise_type):
+    """Split a shard reply into exercises at its '##'-'####' headings"""
+    exercises = []
+    for section in split_sections(text, max_level=4):
+        if section.level < 2:
+            continue
+        lines = section.body.strip("\n").splitlines()
+        answer_at = next((i for i, line in enumerate(lines) if _ANSWER_LABEL.match(line)), len(lines))
+        question = "\n".join(lines[:answer_at]).strip()
+        answer = _ANSWER_LABEL.sub("", "\n".join(lines[answer_at:]), count=1).strip()
+        title = _NUMBER_LABEL.sub("", section.heading, count=1).strip()
+        if question or answer:
+            exercises.append(Exercise(title, question, answer, exercise_type))
+    return exercises
+
+
+def merge_exercises(form_data, exercises):
+    """Return (Markdown, unique exercises): duplicates dropped, exercises renumbered, answers collected"""
+    unique, seen = [], set()
+    for exercise in exercises:
+        if exercise.key not in seen:
+            seen.add(exercise.key)
+            unique.append(exercise)
+    unique = unique[:form_data.get('num_exercises', len(unique))]
+
+    lines = [f"# {form_data['subject']}: {form_data['topic']}", ""]
+    for number, exercise in enumerate(unique, start=1):
+        lines += [f"### {number}. {exercise.title or exercise.exercise_type}", "", exercise.question, ""]
+    answers = [(number, exercise) for number, exercise in enumerate(unique, start=1) if exercise.answer]
+    if answers:
+        lines += ["## Answer Key", ""]
+        for number, exercise in answers:
+            lines += [f"**{number}.** {exercise.answer}", ""]
+    return "\n".join(lines), unique
+
+
+class ShardResult:
+    def __init__(self, shard, exercises=(), error=None, attempts=0, elapsed=0.0):
+        self.shard = shard
+        self.exercises = list(exercises)
+        self.error = error
+        self.attempts = attempts
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class ShardedGenerator:
+    """Generate an exercise list as concurrent shards, each retried on its own"""
+
+    def __init__(self, client, form_data, shard_size=SHARD_SIZE, max_workers=None, max_retries=3, backoff=1.0,
+                 rate_limiter=None):
+        self.client = client
+        self.form_data = form_data
+        self.shard_size = shard_size
+        self.max_workers = max_workers or int(os.environ.get("EDUADOCS_SHARD_WORKERS", "8"))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = rate_limiter
+
+    def generate_shard(self, shard, avoid=(), cancel_event=None):
+        started = time.perf_counter()
+        prompt = build_shard_prompt(self.form_data, shard, avoid)
+        text, attempts, error = generate_with_retry(self.client, prompt, self.max_retries, self.backoff,
+                                                    self.rate_limiter, cancel_event)
+        exercises = parse_exercises(text, shard.exercise_type) if error is None else []
+        if error is None and not exercises:
+            error = "The reply contained no exercises."
+        return ShardResult(shard, exercises[:shard.count], error, attempts, time.perf_counter() - started)
+
+    def run(self, shards, avoid=()):
+        """Yield a `ShardResult` for each shard as soon as it finishes"""
+        cancel_event = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="shard")
+        try:
+            futures = [executor.submit(self.generate_shard, shard, avoid, cancel_event) for shard in shards]
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            cancel_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_sharded_draft_job(job, generator, cache_key=None):
+    """Job function: generate the shards, top up once for failed or duplicate exercises, then merge"""
+    started = time.perf_counter()
+    form_data = generator.form_data
+    wanted = form_data.get('num_exercises', 10)
+    results = []
+
+    def run_round(shards, avoid=()):
+        round_results = generator.run(shards, avoid)
+        for done, result in enumerate(round_results, start=1):
+            results.append(result)
+            # Keep shard order in the merged document so it does not depend on timing
+            ordered = sorted(results, key=lambda item: item.shard.index)
+            text, _ = merge_exercises(form_data, [exercise for item in ordered for exercise in item.exercises])
+            job.update(progress=min(done / len(shards), 0.99), partial=text,
+                       message=f"{done} of {len(shards)} shards done")
+            if job.cancelled:
+                round_results.close()
+                break
+        job.check_cancelled()
+
+    run_round(plan_shards(form_data, shard_size=generator.shard_size))
+    _, unique = merge_exercises(form_data, [exercise for result in results for exercise in result.exercises])
+    if 0 < len(unique) < wanted:
+        offset = len(results)
+        top_up = plan_shards(form_data, wanted - len(unique), generator.shard_size)
+        for shard in top_up:
+            shard.index += offset
+        run_round(top_up, avoid=[exercise.summary for exercise in unique])
+
+    ordered = sorted(results, key=lambda item: item.shard.index)
+    exercises = [exercise for result in ordered for exercise in result.exercises]
+    if not exercises:
+        raise LLMError(next((result.error for result in results if result.error), "No exercises were generated."))
+    text, unique = merge_exercises(form_data, exercises)
+    if cache_key and len(unique) == wanted:
+        get_draft_cache().set(cache_key, text)
+    return {
+        'text': text,
+        'stats': None,
+        'shards': {
+            'shards': len(results),
+            'failed': sum(1 for result in results if not result.ok),
+            'retries': sum(max(result.attempts - 1, 0) for result in results),
+            'duplicates': len(exercises) - len(set(exercise.key for exercise in exercises)),
+            'exercises': len(unique),
+            'slowest_shard': max(result.elapsed for result in results),
+            'total_time': time.perf_counter() - started
+        }
+    }
@@ -1,23 +1,40 @@
 import streamlit as st
 import json
-from enum import Enum
+from functools import partial
+from artifacts import ArtifactRef, get_artifact_store
+from cache import content_hash, draft_key, get_draft_cache
+from corrections import CorrectionEngine, Submission, get_rate_limiter, run_correction_job
+from doc_config import OUTPUT_LANGUAGES, DocumentType, LLMProvider
+from instrumentation import get_metrics
+from crews import run_crew_draft_job
+from jobs import DONE, FAILED, FINISHED, QUEUED, RUNNING, get_job_queue
+from library import get_library, grounding
+from llm import LLMError, get_client
+from regeneration import SectionRegenerator, run_section_job, weak_sections
+from rendering import OUTPUT_FORMATS, STYLES, RenderOptions, content_stats, preview_html, run_export_job
+from sections import split_sections
+from sharding import ShardedGenerator, run_sharded_draft_job, should_shard
+from translation import Translator, read_bundle, run_translation_export_job
+from warmup import start_warmup
 
-class DocumentType(Enum):
-    SUMMARY = "Summary"
-    EXERCISES = "Exercise List"
-    CORRECTION = "Exercise Correction"
+EXPORT_KINDS = ("export", "translation_export")
 
-class LLMProvider(Enum):
-    OPENAI = "OpenAI"
-    GOOGLE = "Google (Gemini)"
-    HUGGINGFACE = "HuggingFace"
-    OLLAMA = "Ollama"
+# (label, timing) shown in the sidebar
+PIPELINE_STAGES = [
+    ("Prompt Build", "prompt_build_seconds"),
+    ("LLM First Token", "llm_time_to_first_token_seconds"),
+    ("LLM Call", "llm_call_seconds"),
+    ("Extraction", "extraction_seconds"),
+    ("Rendering", "render_seconds"),
+    ("Export", "export_seconds")
+]
 
 class StreamlitUI:
     def __init__(self):
         self.initialize_session_state()
         self.setup_page_config()
         self.display_interface()
+        self.warm_up()
 
     def setup_page_config(self):
         st.set_page_config(
@@ -28,12 +45,62 @@ class StreamlitUI:
         )
 
     def initialize_session_state(self):
-        if 'generated_draft' not in st.session_state:
-            st.session_state.generated_draft = ""
-        if 'approved_content' not in st.session_state:
-            st.session_state.approved_content = ""
         if 'generation_step' not in st.session_state:
             st.session_state.generation_step = "input"  # input, draft, approved, final
+        
+        # Pick up a background job from the URL, e.g. after the tab was closed
+        job_id = st.query_params.get("job")
+        if job_id and st.session_state.get('resumed_job') != job_id:
+            st.session_state.resumed_job = job_id
+            self.resume_job(job_id)
+
+    def warm_up(self):
+        """After the page is drawn, load the export and provider libraries likely to be needed next"""
+        chosen = OUTPUT_FORMATS.get(st.session_state.get('output_format'), OUTPUT_FORMATS["DOCX (Word Document)"])[0]
+        formats = [chosen] + [extension for extension, _ in OUTPUT_FORMATS.values() if extension != chosen]
+        start_warmup(formats=formats, providers=[st.session_state.llm_provider], uploads=["pdf"])
+
+    # Documents, form data and uploads live in the shared artifact store; session state keeps handles
+    @property
+    def generated_draft(self):
+        return self.load_artifact('generated_draft', "")
+
+    @generated_draft.setter
+    def generated_draft(self, value):
+        self.store_artifact('generated_draft', value)
+
+    @property
+    def approved_content(self):
+        return self.load_artifact('approved_content', "")
+
+    @approved_content.setter
+    def approved_content(self, value):
+        self.store_artifact('approved_content', value)
+
+    @property
+    def form_data(self):
+        return json.loads(self.load_artifact('form_data', "null"))
+
+    @form_data.setter
+    def form_data(self, value):
+        self.store_artifact('form_data', json.dumps(value, ensure_ascii=False))
+
+    def load_artifact(self, key, default):
+        ref = st.session_state.get(key)
+        value = get_artifact_store().get(ref) if ref is not None else None
+        return default if value is None else value
+
+    def store_artifact(self, key, value):
+        ref = get_artifact_store().put(value)
+        self.release_artifacts(key)
+        st.session_state[key] = ref
+
+    def release_artifacts(self, key):
+        """Drop a session key, giving back the artifact references it holds"""
+        value = st.session_state.pop(key, None)
+        refs = [value] if isinstance(value, ArtifactRef) else [ref for _, ref in value or []]
+        for ref in refs:
+            ref.release()
 
     def display_interface(self):
         # Sidebar configuration
@@ -84,7 +151,7 @@ class StreamlitUI:
         st.sidebar.subheader("🌐 Language")
         st.sidebar.selectbox(
             'Output Language:',
-            ['English', 'Português', 'Español', 'Français', '日本語', '普通话', 'Русский', 'हिंदी'],
+            OUTPUT_LANGUAGES,
             key="output_language"
         )
         
@@ -96,10 +163,46 @@ class StreamlitUI:
         current_step_index = progress_steps.index(st.session_state.generation_step.title()) if st.session_state.generation_step.title() in progress_steps else 0
         st.sidebar.progress((current_step_index + 1) / len(progress_steps))
         st.sidebar.write(f"Current Step: {progress_steps[current_step_index]}")
+        
+        st.sidebar.divider()
+        
+        # Background jobs
+        st.sidebar.subheader("🧵 Background Jobs")
+        metrics = get_job_queue().metrics()
+        st.sidebar.write(f"**Queued:** {metrics['queue_depth']} · **Running:** {metrics['running']}")
+        st.sidebar.write(f"**Avg Wait:** {metrics['avg_wait']:.1f}s · **Avg Run:** {metrics['avg_run']:.1f}s")
+        self.display_pipeline_metrics()
+        resume_id = st.sidebar.text_input("Resume Job ID:", key="resume_job_id").strip()
+        if st.sidebar.button("📥 Resume Job") and resume_id:
+            if get_job_queue().get(resume_id) is None:
+                st.sidebar.error("No job with that ID was found.")
+            else:
+                st.query_params["job"] = resume_id
+                st.rerun()
+
+    def display_pipeline_metrics(self):
+        """Rolling timings of each pipeline stage in this server process"""
+        metrics = get_metrics()
+        with st.sidebar.expander("📈 Pipeline Timings"):
+            st.write(f"**Forms Submitted:** {metrics.counter('form_submissions_total')} · "
+                     f"**LLM Errors:** {metrics.counter('llm_errors_total')}")
+            for label, name in PIPELINE_STAGES:
+                timing = metrics.timing(name)
+                if timing.count:
+                    st.write(f"**{label}:** p50 {timing.quantile(0.5):.2f}s · p95 {timing.quantile(0.95):.2f}s "
+                             f"({timing.count})")
+            artifacts = get_artifact_store().stats()
+            st.write(f"**Artifacts:** {artifacts['memory_items']} in memory "
+                     f"({artifacts['memory_bytes'] / 1024 / 1024:.1f} MiB) · "
+                     f"{artifacts['deduplicated']} deduplicated")
+            st.caption(f"Exported to `{metrics.snapshot_path}` for scraping.")
 
     def display_input_form(self):
         st.header("📝 Content Specification")
         
+        if st.session_state.get('draft_error'):
+            st.error(f"Draft generation failed: {st.session_state.pop('draft_error')}")
+        
         col1, col2 = st.columns([2, 1])
         
         with col1:
@@ -117,6 +220,8 @@ class StreamlitUI:
                 
                 # Additional details
                 st.subheader("📋 Additional Details")
+                num_exercises, difficulty, exercise_types = None, None, []
+                uploaded_files = []
                 
                 if doc_type == DocumentType.SUMMARY.value:
                     details = st.text_area(
@@ -165,12 +270,16 @@ class StreamlitUI:
                     placeholder="Any other relevant information, constraints, or special requirements...",
                     height=100
                 )
+                use_library = st.checkbox("📚 Build on similar approved documents", value=True,
+                                          help="Outline the closest approved document in the prompt")
                 
                 submitted = st.form_submit_button("🚀 Generate Draft", type="primary")
                 
-                if submitted and subject and topic:
-                    # Store form data in session state
-                    st.session_state.form_data = {
+                if submitted and doc_type == DocumentType.CORRECTION.value and not uploaded_files:
+                    st.error("Please upload at least one student submission.")
+                elif submitted and subject and topic:
+                    # Store form data in the artifact store, session state keeps a handle
+                    form_data = {
                         'document_type': doc_type,
                         'subject': subject,
                         'topic': topic,
@@ -180,10 +289,25 @@ class StreamlitUI:
                         'language': st.session_state.output_language,
                         'llm_provider': st.session_state.llm_provider
                     }
+                    if doc_type == DocumentType.EXERCISES.value:
+                        form_data.update({
+                            'num_exercises': int(num_exercises),
+                            'difficulty': difficulty,
+                            'exercise_types': exercise_types
+                        })
+                    if doc_type == DocumentType.CORRECTION.value:
+                        submissions = [(f.name, f.getvalue()) for f in uploaded_files]
+                        form_data['submissions'] = [f"{name}:{content_hash(data)}" for name, data in submissions]
+                        self.release_artifacts('submissions')
+                        store = get_artifact_store()
+                        st.session_state.submissions = [(name, store.put(data)) for name, data in submissions]
+                        st.session_state.library_matches = []
+                    else:
+                        self.find_library_matches(form_data, ground=use_library)
+                    self.form_data = form_data
                     
-                    # TODO: Call CrewAI here to generate draft
-                    st.session_state.generated_draft = self.simulate_draft_generation()
-                    st.session_state.generation_step = "draft"
+                    get_metrics().incr("form_submissions_total", document_type=doc_type)
+                    self.start_draft_generation()
                     st.rerun()
                 elif submitted:
                     st.error("Please fill in at least the Subject and Topic fields.")
@@ -215,65 +339,165 @@ class StreamlitUI:
                          conceptual problems
                 """)
 
+    def display_preview(self, content):
+        """Rendered HTML preview of Markdown `content`; st.html rejects an empty body"""
+        if content and content.strip():
+            st.html(preview_html(content))
+        else:
+            st.info("The content is empty. Edit it or regenerate the draft to see a preview.")
+
     def display_draft_review(self):
+        if st.session_state.get('draft_job'):
+            self.display_draft_job()
+            return
+
         st.header("📋 Draft Review")
         
+        if st.session_state.get('section_error'):
+            st.error(f"Section regeneration failed: {st.session_state.pop('section_error')}")
+        
         col1, col2 = st.columns([3, 1])
         
         with col1:
             st.subheader("Generated Draft (Markdown)")
             
             # Display the generated draft
-            draft_container = st.container()
-            with draft_container:
-                st.markdown("**Preview:**")
-                st.markdown(st.session_state.generated_draft)
+            st.markdown("**Preview:**")
+            with st.container(height=600):
+                self.display_preview(self.generated_draft)
             
             st.divider()
             
-            # Editable version
-            st.subheader("✏️ Edit Draft")
-            edited_draft = st.text_area(
-                "Make your modifications:",
-                value=st.session_state.generated_draft,
-                height=400,
-                key="edited_draft"
-            )
+            # Editable version, rerun on its own while editing
+            self.draft_editor()
+        
+        with col2:
+            st.subheader("📊 Content Analysis")
+            counts = content_stats(self.generated_draft)
+            st.metric("Word Count", counts['words'])
+            st.metric("Characters", counts['characters'])
+            st.metric("Sections", counts['sections'])
             
-            # Action buttons
-            col_btn1, col_btn2, col_btn3, col_btn4 = st.columns(4)
+            if st.session_state.get('draft_from_cache'):
+                st.caption("♻️ Loaded from the draft cache. Use Regenerate for a fresh draft.")
+            if st.session_state.get('draft_from_library'):
+                st.caption(f"📚 Started from the approved \"{st.session_state.draft_from_library}\". "
+                           "Use Regenerate for a fresh draft.")
             
-            with col_btn1:
-                if st.button("🔄 Regenerate", type="secondary"):
-                    st.session_state.generated_draft = self.simulate_draft_generation()
-                    st.rerun()
+            stats = st.session_state.get('draft_stats')
+            if stats:
+                st.subheader("⏱️ Generation")
+                if stats['time_to_first_token'] is not None:
+                    st.metric("Time to First Token", f"{stats['time_to_first_token']:.2f}s")
+                st.metric("Tokens/sec", f"{stats['tokens_per_second']:.1f}")
+                st.metric("Total Time", f"{stats['total_time']:.1f}s")
             
-            with col_btn2:
-                if st.button("💾 Save Changes", type="secondary"):
-                    st.session_state.generated_draft = edited_draft
-                    st.success("Changes saved!")
+            crew_stats = st.session_state.get('crew_stats')
+            if crew_stats:
+                st.subheader("🧭 Crew Tasks")
+                st.caption(f"Critical path ({crew_stats['critical_path_time']:.1f}s): "
+                           + " → ".join(crew_stats['critical_path']))
+                for task in crew_stats['tasks']:
+                    note = " (cached)" if task['cached'] else ""
+                    st.write(f"**{task['name']}**: {task['started']:.1f}s → {task['finished']:.1f}s{note}")
             
-            with col_btn3:
-                if st.button("✅ Approve Draft", type="primary"):
-                    st.session_state.approved_content = edited_draft
-                    st.session_state.generation_step = "approved"
-                    st.rerun()
+            shard_stats = st.session_state.get('shard_stats')
+            if shard_stats:
+                st.subheader("🧩 Shards")
+                st.metric("Exercises", shard_stats['exercises'])
+                st.metric("Shards", f"{shard_stats['shards']} ({shard_stats['failed']} failed)")
+                st.metric("Slowest Shard", f"{shard_stats['slowest_shard']:.1f}s")
+                st.metric("Total Time", f"{shard_stats['total_time']:.1f}s")
+                st.caption(f"{shard_stats['retries']} retries, {shard_stats['duplicates']} duplicates removed")
             
-            with col_btn4:
-                if st.button("⬅️ Back to Input", type="secondary"):
-                    st.session_state.generation_step = "input"
-                    st.rerun()
-        
-        with col2:
-            st.subheader("📊 Content Analysis")
-            st.metric("Word Count", len(st.session_state.generated_draft.split()))
-            st.metric("Characters", len(st.session_state.generated_draft))
+            section_stats = st.session_state.get('section_stats')
+            if section_stats:
+                st.subheader("🧩 Section Regeneration")
+                st.metric("Sections", f"{section_stats['regenerated']} of {section_stats['sections']}")
+                share = section_stats['prompt_characters'] / max(section_stats['document_characters'], 1)
+                st.metric("Prompt Size", f"{share:.0%} of the draft")
+                st.metric("Total Time", f"{section_stats['total_time']:.1f}s")
+            
+            self.display_library_matches()
+            
+            correction_stats = st.session_state.get('correction_stats')
+            if correction_stats and self.form_data['document_type'] == DocumentType.CORRECTION.value:
+                st.subheader("📝 Corrections")
+                st.metric("Submissions", correction_stats['submissions'])
+                st.metric("Failed", correction_stats['failed'])
+                st.metric("Total Time", f"{correction_stats['total_time']:.1f}s")
+            
+            cache_stats = get_draft_cache().stats()
+            st.subheader("♻️ Draft Cache")
+            st.write(f"**Hits:** {cache_stats['memory_hits'] + cache_stats['disk_hits']} "
+                     f"(memory {cache_stats['memory_hits']}, disk {cache_stats['disk_hits']})")
+            st.write(f"**Misses:** {cache_stats['misses']}")
             
             st.subheader("🎯 Original Request")
             if 'form_data' in st.session_state:
-                st.write(f"**Type:** {st.session_state.form_data['document_type']}")
-                st.write(f"**Subject:** {st.session_state.form_data['subject']}")
-                st.write(f"**Topic:** {st.session_state.form_data['topic']}")
+                form_data = self.form_data
+                st.write(f"**Type:** {form_data['document_type']}")
+                st.write(f"**Subject:** {form_data['subject']}")
+                st.write(f"**Topic:** {form_data['topic']}")
+
+    @st.fragment
+    def draft_editor(self):
+        st.subheader("✏️ Edit Draft")
+        edited_draft = st.text_area(
+            "Make your modifications:",
+            value=self.generated_draft,
+            height=400,
+            key="edited_draft"
+        )
+        stats = content_stats(edited_draft)
+        st.caption(f"{stats['words']} words · {stats['characters']} characters · "
+                   f"about {stats['reading_minutes']:.0f} min read")
+        
+        # Action buttons
+        col_btn1, col_btn2, col_btn3, col_btn4 = st.columns(4)
+        
+        with col_btn1:
+            if st.button("🔄 Regenerate", type="secondary"):
+                # Regenerating always asks the model for a fresh draft
+                self.start_draft_generation(use_cache=False)
+                st.rerun()
+        
+        with col_btn2:
+            if st.button("💾 Save Changes", type="secondary"):
+                self.generated_draft = edited_draft
+                st.toast("Changes saved!")
+                # The preview and analysis outside this fragment show the saved draft
+                st.rerun()
+        
+        with col_btn3:
+            if st.button("✅ Approve Draft", type="primary"):
+                self.approved_content = edited_draft
+                if self.form_data['document_type'] != DocumentType.CORRECTION.value:
+                    # Later requests on similar topics can start from it
+                    get_library().add(self.form_data, edited_draft)
+                st.session_state.generation_step = "approved"
+                st.rerun()
+        
+        with col_btn4:
+            if st.button("⬅️ Back to Input", type="secondary"):
+                st.session_state.generation_step = "input"
+                st.rerun()
+        
+        sections = split_sections(edited_draft)
+        weak = weak_sections(sections)
+        with st.expander(f"🧩 Regenerate Sections ({len(weak)} flagged as weak)", expanded=bool(weak)):
+            selected = st.multiselect(
+                "Sections to regenerate:",
+                options=range(len(sections)),
+                default=sorted(weak),
+                format_func=lambda index: sections[index].title + (f" ⚠️ {weak[index]}" if index in weak else "")
+            )
+            instructions = st.text_input("Instructions (optional):", placeholder="e.g. add a worked example")
+            if st.button("🧩 Regenerate Selected", type="secondary", disabled=not selected):
+                # Keep the edits made so far, only the selected sections are rewritten
+                self.generated_draft = edited_draft
+                self.start_section_regeneration(edited_draft, selected, instructions)
+                st.rerun()
 
     def display_approved_content(self):
         st.header("✅ Content Approved")
@@ -283,40 +507,30 @@ class StreamlitUI:
         
         with col1:
             st.subheader("📄 Final Content Preview")
-            st.markdown(st.session_state.approved_content)
+            with st.container(height=600):
+                self.display_preview(self.approved_content)
             
             st.divider()
             
-            # Document format options
-            st.subheader("📤 Document Generation Options")
-            
-            col_fmt1, col_fmt2 = st.columns(2)
-            with col_fmt1:
-                output_format = st.selectbox(
-                    "Output Format:",
-                    ["DOCX (Word Document)", "PDF", "HTML"],
-                    key="output_format"
-                )
-                
-                include_header = st.checkbox("Include Header with Metadata", value=True)
-                include_footer = st.checkbox("Include Footer with Page Numbers", value=True)
-            
-            with col_fmt2:
-                template_style = st.selectbox(
-                    "Document Style:",
-                    ["Academic", "Professional", "Casual", "Custom"],
-                    key="template_style"
-                )
-                
-                font_size = st.selectbox("Font Size:", ["10pt", "11pt", "12pt", "14pt"], index=2)
+            # Changing an option reruns only the options
+            self.export_options()
         
         with col2:
             st.subheader("🚀 Actions")
             
             if st.button("📄 Generate Document", type="primary"):
-                # TODO: Call CrewAI to generate final document
-                st.session_state.generation_step = "final"
-                st.rerun()
+                # Widget values are dropped once the final page stops rendering them
+                st.session_state.render_options = {
+                    'output_format': st.session_state.output_format,
+                    'template_style': st.session_state.template_style,
+                    'font_size': st.session_state.font_size,
+                    'include_header': st.session_state.include_header,
+                    'include_footer': st.session_state.include_footer
+                }
+                st.session_state.fanout_languages = st.session_state.extra_languages
+                if self.start_export():
+                    st.session_state.generation_step = "final"
+                    st.rerun()
             
             if st.button("✏️ Edit Content", type="secondary"):
                 st.session_state.generation_step = "draft"
@@ -326,33 +540,82 @@ class StreamlitUI:
                 self.reset_session()
                 st.rerun()
 
+    @st.fragment
+    def export_options(self):
+        st.subheader("📤 Document Generation Options")
+        
+        col_fmt1, col_fmt2 = st.columns(2)
+        with col_fmt1:
+            st.selectbox("Output Format:", list(OUTPUT_FORMATS), key="output_format")
+            st.checkbox("Include Header with Metadata", value=True, key="include_header")
+            st.checkbox("Include Footer with Page Numbers", value=True, key="include_footer")
+        
+        with col_fmt2:
+            st.selectbox("Document Style:", list(STYLES), key="template_style")
+            st.selectbox("Font Size:", ["10pt", "11pt", "12pt", "14pt"], index=2, key="font_size")
+        
+        source_language = self.form_data['language']
+        st.multiselect(
+            "🌐 Also Produce In:",
+            [language for language in OUTPUT_LANGUAGES if language != source_language],
+            key="extra_languages",
+            help="Translates the approved content into each language in parallel and bundles the documents in a ZIP."
+        )
+
     def display_final_document(self):
         st.header("🎉 Document Generated Successfully!")
         
         col1, col2 = st.columns([3, 1])
         
         with col1:
-            st.success("Your document has been generated and is ready for download!")
-            
-            # Simulate document download
-            document_data = self.simulate_document_generation()
+            if 'export_job' not in st.session_state and not self.start_export():
+                return
+            status = get_job_queue().get(st.session_state.export_job)
             
-            st.download_button(
-                label="📥 Download Document",
-                data=document_data,
-                file_name=f"eduadocs_{st.session_state.form_data['subject']}_{st.session_state.form_data['topic']}.docx",
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                type="primary"
-            )
+            if status is not None and status['status'] == DONE and status['kind'] == "translation_export":
+                st.success("Your documents have been generated and are ready for download!")
+                bundle = get_job_queue().result(st.session_state.export_job)
+                st.download_button(
+                    label="📦 Download All (ZIP)",
+                    data=bundle,
+                    file_name=f"{self.file_stem()}.zip",
+                    mime="application/zip",
+                    type="primary",
+                    on_click="ignore"
+                )
+                options = self.get_render_options()
+                for name, data in read_bundle(bundle).items():
+                    st.download_button(label=f"📥 {name}", data=data, file_name=name, mime=options.mime,
+                                       on_click="ignore")
+            elif status is not None and status['status'] == DONE:
+                st.success("Your document has been generated and is ready for download!")
+                options = self.get_render_options()
+                st.download_button(
+                    label="📥 Download Document",
+                    # Read from the job store only when the button is clicked
+                    data=partial(get_job_queue().result, st.session_state.export_job),
+                    file_name=f"{self.file_stem()}.{options.extension}",
+                    mime=options.mime,
+                    type="primary",
+                    on_click="ignore"
+                )
+            elif status is not None and status['status'] in (QUEUED, RUNNING):
+                self.poll_export_job()
+            else:
+                st.error(f"Document generation failed: {status['error'] if status else 'job not found'}")
+                if st.button("🔁 Try Again", type="secondary"):
+                    self.release_job('export_job')
+                    st.rerun()
             
             st.subheader("📋 Generation Summary")
             if 'form_data' in st.session_state:
-                st.write(f"**Document Type:** {st.session_state.form_data['document_type']}")
-                st.write(f"**Subject:** {st.session_state.form_data['subject']}")
-                st.write(f"**Topic:** {st.session_state.form_data['topic']}")
-                st.write(f"**Target Audience:** {st.session_state.form_data['audience']}")
-                st.write(f"**Language:** {st.session_state.form_data['language']}")
-                st.write(f"**LLM Provider:** {st.session_state.form_data['llm_provider']}")
+                form_data = self.form_data
+                st.write(f"**Document Type:** {form_data['document_type']}")
+                st.write(f"**Subject:** {form_data['subject']}")
+                st.write(f"**Topic:** {form_data['topic']}")
+                st.write(f"**Target Audience:** {form_data['audience']}")
+                st.write(f"**Language:** {form_data['language']}")
+                st.write(f"**LLM Provider:** {form_data['llm_provider']}")
         
         with col2:
             st.subheader("🔄 Next Steps")
@@ -362,39 +625,266 @@ class StreamlitUI:
                 st.rerun()
             
             if st.button("🔍 View Content", type="secondary"):
+                self.release_job('export_job')
                 st.session_state.generation_step = "approved"
                 st.rerun()
             
             st.subheader("📊 Statistics")
-            st.metric("Documents Created", "1")
-            st.metric("Success Rate", "100%")
+            metrics = get_metrics()
+            exported = sum(metrics.counter("jobs_total", kind=kind, status=DONE) for kind in EXPORT_KINDS)
+            failed = sum(metrics.counter("jobs_total", kind=kind, status=FAILED) for kind in EXPORT_KINDS)
+            st.metric("Documents Created", metrics.counter("documents_created_total"))
+            st.metric("Success Rate", f"{exported / (exported + failed):.0%}" if exported + failed else "n/a")
+            st.metric("Avg Export Time", f"{metrics.timing('export_seconds').mean:.1f}s")
+
+    def start_draft_generation(self, use_cache=True):
+        """Switch to the draft step, reusing a cached draft or queueing a generation job"""
+        form_data = self.form_data
+        st.session_state.draft_cache_key = draft_key(form_data, st.session_state)
+        st.session_state.draft_stats = None
+        st.session_state.correction_stats = None
+        st.session_state.crew_stats = None
+        st.session_state.shard_stats = None
+        st.session_state.section_stats = None
+        st.session_state.draft_from_library = None
+        st.session_state.generation_step = "draft"
+
+        cached = get_draft_cache().get(st.session_state.draft_cache_key) if use_cache else None
+        st.session_state.draft_from_cache = cached is not None
+        self.generated_draft = cached or ""
+        if cached is not None:
+            return
+
+        try:
+            client = get_client(form_data['llm_provider'], st.session_state)
+        except LLMError as e:
+            st.session_state.draft_error = str(e)
+            st.session_state.generation_step = "input"
+            return
+
+        if form_data['document_type'] == DocumentType.CORRECTION.value:
+            store = get_artifact_store()
+            submissions = [Submission(name, data=store.get(ref)) for name, ref in st.session_state.submissions]
+            engine = CorrectionEngine(client, form_data, rate_limiter=get_rate_limiter(form_data['llm_provider']))
+            job_id = get_job_queue().submit("corrections", run_correction_job, engine, submissions,
+                                            st.session_state.draft_cache_key, meta={'form_data': form_data})
+        elif should_shard(form_data):
+            generator = ShardedGenerator(client, form_data, rate_limiter=get_rate_limiter(form_data['llm_provider']))
+            job_id = get_job_queue().submit("draft", run_sharded_draft_job, generator,
+                                            st.session_state.draft_cache_key, meta={'form_data': form_data})
+        else:
+            job_id = get_job_queue().submit("draft", run_crew_draft_job, client, form_data,
+                                            st.session_state.draft_cache_key, use_cache, meta={'form_data': form_data})
+        self.track_job('draft_job', job_id)
+
+    def find_library_matches(self, form_data, ground=True):
+        """Look up approved documents similar to the form, outlining the closest one in its prompt"""
+        library = get_library()
+        matches = library.search(form_data)
+        st.session_state.library_matches = [match.as_dict() for match in matches]
+        if ground and matches:
+            form_data['reference'] = grounding(library.get(matches[0].id))
+
+    def display_library_matches(self):
+        """Offer approved documents similar to the request as a starting point instead of a new draft"""
+        matches = st.session_state.get('library_matches')
+        if not matches:
+            return
+        st.subheader("📚 From Your Library")
+        for match in matches:
+            st.write(f"**{match['title']}** · {match['audience']} · {match['words']} words")
+            if st.button("📄 Start from this", key=f"library_{match['id']}", type="secondary"):
+                self.start_from_library(match)
+                st.rerun()
+
+    def start_from_library(self, match):
+        """Use an approved document as the draft, stopping any generation in progress"""
+        if st.session_state.get('draft_job'):
+            get_job_queue().cancel(st.session_state.draft_job)
+            self.release_job('draft_job')
+        self.generated_draft = get_library().get(match['id']) or ""
+        st.session_state.pop('edited_draft', None)
+        for key in ['draft_stats', 'crew_stats', 'shard_stats', 'section_stats', 'correction_stats']:
+            st.session_state[key] = None
+        st.session_state.draft_from_cache = False
+        st.session_state.draft_from_library = match['title']
+        st.session_state.generation_step = "draft"
+        get_metrics().incr("library_starts_total")
+
+    def start_section_regeneration(self, content, indices, instructions=""):
+        """Queue a job that rewrites only the selected sections of the draft"""
+        form_data = self.form_data
+        try:
+            client = get_client(form_data['llm_provider'], st.session_state)
+        except LLMError as e:
+            st.error(f"❌ {e}")
+            return
+        st.session_state.section_stats = None
+        regenerator = SectionRegenerator(client, form_data, rate_limiter=get_rate_limiter(form_data['llm_provider']))
+        job_id = get_job_queue().submit("sections", run_section_job, regenerator, content, list(indices),
+                                        instructions, meta={'form_data': form_data})
+        self.track_job('draft_job', job_id)
 
-    def simulate_draft_generation(self):
-        """Simulate draft generation - replace with actual CrewAI call"""
-        form_data = st.session_state.form_data
-        return f"""# {form_data['subject']}: {form_data['topic']}
+    def display_draft_job(self):
+        """Show the running draft or correction job until it finishes"""
+        st.header("✍️ Generating Draft")
+        st.caption(f"Job ID `{st.session_state.draft_job}`: you can close this page and resume "
+                   "the job from the sidebar later.")
 
-## Introduction
-This is a simulated draft for {form_data['document_type'].lower()} on {form_data['topic']} in {form_data['subject']}.
+        if st.button("⏹️ Cancel Generation", type="secondary"):
+            status = get_job_queue().get(st.session_state.draft_job)
+            get_job_queue().cancel(st.session_state.draft_job)
+            if status and isinstance(status['partial'], str):
+                # Keep whatever was generated so far for editing
+                self.generated_draft = status['partial']
+            self.release_job('draft_job')
+            st.rerun()
 
-## Main Content
-Generated content would appear here based on the specified requirements:
-- **Target Audience:** {form_data['audience']}
-- **Additional Details:** {form_data['details']}
+        self.display_library_matches()
+        self.poll_draft_job()
 
-## Conclusion
-This concludes the simulated draft content.
+    @st.fragment(run_every=0.5)
+    def poll_draft_job(self):
+        queue = get_job_queue()
+        status = queue.get(st.session_state.draft_job)
+        if status is None or status['status'] in FINISHED:
+            self.finish_draft_job(status)
+            st.rerun()
 
-*Generated using {form_data['llm_provider']} in {form_data['language']}*
-"""
+        if status['status'] == QUEUED:
+            st.info(f"⏳ Queued, {status['position']} job(s) ahead")
+        elif status['kind'] == "corrections":
+            st.progress(status['progress'], text=status['message'] or "Correcting submissions...")
+            for item in status['partial'] or []:
+                if item['ok']:
+                    st.write(f"✅ **{item['name']}** graded in {item['elapsed']:.1f}s")
+                else:
+                    st.write(f"❌ **{item['name']}**: {item['error']}")
+        else:
+            st.info(f"Generating... {status['message']}" if status['message'] else "Waiting for the first token...")
+            if status['partial']:
+                st.markdown(status['partial'])
 
-    def simulate_document_generation(self):
-        """Simulate document generation - replace with actual document creation"""
-        return b"Simulated DOCX content - replace with actual python-docx generated document"
+    def finish_draft_job(self, status):
+        """Load a finished draft or correction job into the session"""
+        queue = get_job_queue()
+        if status is None:
+            st.session_state.draft_error = "The generation job could not be found."
+            st.session_state.generation_step = "input"
+        elif status['status'] == DONE:
+            result = queue.result(status['id'])
+            self.generated_draft = result['text']
+            # Let the editor pick up the new draft instead of its previous contents
+            st.session_state.pop('edited_draft', None)
+            if status['kind'] == "corrections":
+                st.session_state.correction_stats = result['stats']
+            elif status['kind'] == "sections":
+                st.session_state.section_stats = result['stats']
+            else:
+                st.session_state.draft_stats = result['stats']
+                st.session_state.crew_stats = result.get('crew')
+                st.session_state.shard_stats = result.get('shards')
+        elif status['status'] == FAILED and status['kind'] == "sections":
+            # The draft and its edits are still there, so stay on it and retry from the editor
+            st.session_state.section_error = status['error']
+        elif status['status'] == FAILED:
+            st.session_state.draft_error = status['error']
+            st.session_state.generation_step = "input"
+        self.release_job('draft_job')
+
+    def start_export(self):
+        """Queue rendering of the approved content, translating it first for extra languages"""
+        form_data = self.form_data
+        content = self.approved_content
+        options = self.get_render_options()
+        languages = st.session_state.get('fanout_languages') or []
+        meta = {
+            'form_data': form_data,
+            'content': content,
+            'render_options': st.session_state.get('render_options', {}),
+            'languages': languages
+        }
+        if not languages:
+            job_id = get_job_queue().submit("export", run_export_job, content, options, meta=meta)
+            self.track_job('export_job', job_id)
+            return True
+
+        try:
+            client = get_client(form_data['llm_provider'], st.session_state)
+        except LLMError as e:
+            st.error(f"Translation is unavailable: {e}")
+            return False
+        translator = Translator(client, form_data['language'], rate_limiter=get_rate_limiter(form_data['llm_provider']))
+        job_id = get_job_queue().submit(
+            "translation_export", run_translation_export_job, translator, content,
+            [form_data['language']] + languages, options, self.file_stem(), meta=meta
+        )
+        self.track_job('export_job', job_id)
+        return True
+
+    def file_stem(self):
+        form_data = self.form_data
+        return f"eduadocs_{form_data['subject']}_{form_data['topic']}"
+
+    @st.fragment(run_every=0.5)
+    def poll_export_job(self):
+        status = get_job_queue().get(st.session_state.export_job)
+        if status is None or status['status'] in FINISHED:
+            st.rerun()
+        if status['status'] == QUEUED:
+            st.info(f"⏳ Queued, {status['position']} job(s) ahead")
+        else:
+            st.info(f"⚙️ {status['message'] or 'Rendering document'}...")
+
+    def track_job(self, key, job_id):
+        """Remember a job in the session and in the URL so the page can be reopened later"""
+        st.session_state[key] = job_id
+        st.session_state.resumed_job = job_id
+        st.query_params["job"] = job_id
+
+    def release_job(self, key):
+        job_id = st.session_state.pop(key, None)
+        if job_id and st.query_params.get("job") == job_id:
+            del st.query_params["job"]
+
+    def resume_job(self, job_id):
+        """Restore the session for a job submitted earlier, possibly from another session"""
+        status = get_job_queue().get(job_id)
+        if status is None:
+            return False
+        meta = status['meta']
+        self.form_data = meta['form_data']
+        if status['kind'] in ("export", "translation_export"):
+            self.approved_content = meta['content']
+            st.session_state.render_options = meta['render_options']
+            st.session_state.fanout_languages = meta.get('languages', [])
+            st.session_state.export_job = job_id
+            st.session_state.generation_step = "final"
+        else:
+            st.session_state.draft_job = job_id
+            st.session_state.generation_step = "draft"
+        return True
+
+    def get_render_options(self):
+        """Build the document options chosen on the approved-content page"""
+        form_data = self.form_data
+        return RenderOptions(
+            title=f"{form_data['subject']}: {form_data['topic']}",
+            subtitle=f"{form_data['document_type']} · {form_data['audience']}",
+            **st.session_state.get('render_options', {})
+        )
 
     def reset_session(self):
         """Reset session state to start over"""
-        for key in ['generated_draft', 'approved_content', 'form_data']:
+        if st.session_state.get('draft_job'):
+            get_job_queue().cancel(st.session_state.draft_job)
+        self.release_job('draft_job')
+        self.release_job('export_job')
+        for key in ['generated_draft', 'approved_content', 'form_data', 'submissions']:
+            self.release_artifacts(key)
+        for key in ['draft_stats', 'draft_cache_key', 'draft_from_cache', 'correction_stats', 'crew_stats',
+                    'shard_stats', 'section_stats', 'render_options', 'fanout_languages', 'library_matches',
+                    'draft_from_library']:
             if key in st.session_state:
                 del st.session_state[key]
         st.session_state.generation_step = "input"
@@ -0,0 +1,142 @@
+import io
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cache import TieredCache, content_hash
+from corrections import generate_with_retry
+from instrumentation import get_metrics
+from llm import LLMError
+from rendering import render_document
+from sections import join_sections, restore_heading, split_sections
+
+
+def build_translation_prompt(text, source_language, target_language):
+    return "\n".join([
+        f"Translate the following Markdown from {source_language} into {target_language}.",
+        "Keep the Markdown structure exactly: the same headings, heading levels, lists, tables and emphasis.",
+        "Do not translate code blocks, formulas or URLs. Reply with the translated Markdown only.",
+        "",
+        text
+    ])
+
+
+_translation_cache = None
+_translation_cache_lock = threading.Lock()
+
+
+def get_translation_cache():
+    """Return the process-wide cache of translated sections"""
+    global _translation_cache
+    with _translation_cache_lock:
+        if _translation_cache is None:
+            _translation_cache = TieredCache("translations", max_items=1024, ttl=30 * 24 * 3600)
+        return _translation_cache
+
+
+class Translator:
+    """Translate Markdown section by section, concurrently, reusing cached sections.
+
+    Sections are cached by their own content hash, so after an edit only the
+    sections that changed are sent to the model again.
+    """
+
+    def __init__(self, client, source_language, max_workers=None, cache=None, max_retries=3, backoff=1.0,
+                 rate_limiter=None):
+        self.client = client
+        self.source_language = source_language
+        self.max_workers = max_workers or int(os.environ.get("EDUADOCS_TRANSLATION_WORKERS", "8"))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = rate_limiter
+        self.cache = cache or get_translation_cache()
+        self.translated_sections = 0
+        self.reused_sections = 0
+
+    def _key(self, text, target_language):
+        return content_hash(f"{type(self.client).__name__}\0{self.client.model}\0{self.source_language}\0"
+                            f"{target_language}\0{text}")
+
+    def _translate_section(self, text, target_language):
+        prompt = build_translation_prompt(text, self.source_language, target_language)
+        reply, _, error = generate_with_retry(self.client, prompt, self.max_retries, self.backoff, self.rate_limiter)
+        if error is not None:
+            raise LLMError(f"Could not translate into {target_language}: {error}")
+        translated = restore_heading(text, reply.strip())
+        self.cache.set(self._key(text, target_language), translated)
+        return translated
+
+    def fan_out(self, content, target_languages, progress=None):
+        """Return {language: translated Markdown} for every target language.
+
+        All missing sections of all languages share one worker pool. `progress` is
+        called with (done, total) as sections finish.
+        """
+        sections = [section.text for section in split_sections(content)]
+        results = {language: [None] * len(sections) for language in target_languages}
+        pending = []
+        for language in target_languages:
+            if language == self.source_language:
+                results[language] = list(sections)
+                continue
+            for index, text in enumerate(sections):
+                cached = self.cache.get(self._key(text, language)) if text.strip() else text
+                if cached is None:
+                    pending.append((language, index, text))
+                else:
+                    results[language][index] = cached
+                    self.reused_sections += 1
+
+        total, done = len(pending), 0
+        if pending:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="translate")
+            try:
+                futures = {executor.submit(self._translate_section, text, language): (language, index)
+                           for language, index, text in pending}
+                for future in as_completed(futures):
+                    language, index = futures[future]
+                    results[language][index] = future.result()
+                    self.translated_sections += 1
+                    done += 1
+                    if progress is not None:
+                        progress(done, total)
+            finally:
+                # A failed section or a cancelled job drops the sections still queued
+                executor.shutdown(wait=False, cancel_futures=True)
+        return {language: join_sections(texts) for language, texts in results.items()}
+
+
+def bundle_documents(documents):
+    """Zip {file name: bytes} into one archive"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in documents.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def read_bundle(data):
+    """Return {file name: bytes} from a zip made by `bundle_documents`"""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def run_translation_export_job(job, translator, content, languages, options, file_stem):
+    """Job function: translate the approved content into `languages` and render each one"""
+    def progress(done, total):
+        job.update(progress=0.8 * done / total, message=f"Translated {done} of {total} sections")
+        job.check_cancelled()
+
+    metrics = get_metrics()
+    with metrics.timer("export_seconds", kind="translation_export"):
+        translations = translator.fan_out(content, languages, progress)
+        documents = {}
+        for done, (language, text) in enumerate(translations.items(), start=1):
+            job.check_cancelled()
+            documents[f"{file_stem}_{language}.{options.extension}"] = render_document(text, options)
+            job.update(progress=0.8 + 0.2 * done / len(translations),
+                       message=f"Rendered {done} of {len(translations)} documents")
+        bundle = bundle_documents(documents)
+    metrics.incr("documents_created_total", len(documents), format=options.extension)
+    return bundle
@@ -0,0 +1,105 @@
+"""Optional libraries behind each output format and provider, warmed in the background.
+
+Renderers and extractors import their libraries on first use, so the input
+form never waits for them. Once a page is drawn the app calls `start_warmup`,
+and a background thread imports what the current choices are likely to need
+next, recording each import's cost as `import_seconds{module}`.
+"""
+import importlib
+import os
+import queue
+import sys
+import threading
+import time
+
+from doc_config import LLMProvider
+from instrumentation import get_metrics
+
+ENABLED = os.environ.get("EDUADOCS_WARMUP", "1") != "0"
+
+# Libraries imported by the renderer of each output format, by extension
+FORMAT_MODULES = {
+    'docx': ("docx",),
+    'pdf': ("fpdf",),
+    'html': (),
+    'pptx': ("pptx",)
+}
+# Libraries imported by the text extractor of each upload type
+UPLOAD_MODULES = {
+    'pdf': ("pypdf",)
+}
+# Providers served over HTTPS, whose first call builds the process-wide SSL context
+HTTPS_PROVIDERS = (LLMProvider.OPENAI.value, LLMProvider.GOOGLE.value, LLMProvider.HUGGINGFACE.value)
+
+
+def load(name):
+    """Import `name`, recording the time taken when it was not loaded yet. Return None if it is missing."""
+    if name in sys.modules:
+        return sys.modules[name]
+    started = time.perf_counter()
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        return None
+    get_metrics().observe("import_seconds", time.perf_counter() - started, module=name)
+    return module
+
+
+def warm(target):
+    """Prepare one ("format" | "upload" | "provider", name) target"""
+    kind, name = target
+    if kind == "format":
+        for module in FORMAT_MODULES.get(name, ()):
+            load(module)
+    elif kind == "upload":
+        for module in UPLOAD_MODULES.get(name, ()):
+            load(module)
+    elif kind == "provider" and name in HTTPS_PROVIDERS:
+        from llm import get_ssl_context
+        get_ssl_context()
+
+
+class Warmer:
+    """One daemon thread working through targets in the order they were first requested"""
+
+    def __init__(self):
+        self.requested = set()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def request(self, targets):
+        with self._lock:
+            for target in targets:
+                if target not in self.requested:
+                    self.requested.add(target)
+                    self._queue.put(target)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="warmup")
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            target = self._queue.get()
+            try:
+                warm(target)
+            except Exception:
+                # Warming is best effort; the first real use reports any problem
+                pass
+
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def start_warmup(formats=(), providers=(), uploads=()):
+    """Warm the given output format extensions, providers and upload types in the background"""
+    global _warmer
+    if not ENABLED:
+        return
+    with _warmer_lock:
+        if _warmer is None:
+            _warmer = Warmer()
+    _warmer.request([("provider", name) for name in providers]
+                    + [("format", name) for name in formats]
+                    + [("upload", name) for name in uploads])